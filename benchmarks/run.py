@@ -0,0 +1,220 @@
+import argparse
+import json
+import pathlib
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, Any
+
+from benchmarks.server import SyntheticBoard, FakeServerProcess
+from benchmarks.transform import (get_board_resources, build_board_legacy,
+                                  build_board_single_pass)
+from scripts.exporter import export_trello, export_attachments
+from src.trcsvyt.ratelimit import RateGovernor
+from src.trcsvyt.trello import Trello
+from src.trcsvyt.youtrack import YouTrack
+
+EXPORT_SCENARIOS = {
+    'export-bulk': {},
+    'export-snapshot': {'snapshot': True},
+    'export-stream': {'stream': True},
+}
+
+YOUTRACK_SCENARIOS = ['youtrack-iter-issues', 'youtrack-update-bulk']
+
+# Downloads of the card attachments, and their uploads to the Issues
+ATTACHMENT_SCENARIOS = ['attachments-download', 'attachments-upload']
+
+# Offline builds of the rows from the already fetched cards
+TRANSFORM_SCENARIOS = {
+    'transform-legacy': build_board_legacy,
+    'transform-single-pass': build_board_single_pass,
+}
+
+
+def measure(server: FakeServerProcess,
+            scenario: str,
+            run: Callable[[], int]) -> Dict[str, Any]:
+    """
+    Runs the given scenario and measures it.
+
+    :param server: Fake server the scenario runs against
+    :param scenario: Name of the scenario
+    :param run: Function running the scenario and returning the rows count
+    :return: Metrics of the scenario
+    """
+    server.reset_counters()
+    tracemalloc.start()
+    started_at = time.perf_counter()
+    rows_count = run()
+    wall_time = time.perf_counter() - started_at
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'scenario': scenario,
+            'wall_time': wall_time,
+            'requests': server.requests_count,
+            'throttled': server.throttled_count,
+            'peak_memory_mb': peak_memory / 1024 ** 2,
+            'rows': rows_count,
+            'rows_per_second': rows_count / wall_time if wall_time else 0.0}
+
+
+def run_export(server: FakeServerProcess,
+               board: SyntheticBoard,
+               output_dir: pathlib.Path,
+               max_workers: int,
+               rate: float,
+               **kwargs) -> int:
+    trello = Trello(api_base_url=f'{server.url}/1',
+                    api_key='bench', api_token='bench',
+                    max_workers=max_workers,
+                    governor=RateGovernor(rate=rate, burst=max_workers,
+                                          backoff_base=0.1))
+    users_mapping = {member['username']: member['username']
+                     for member in board.members}
+    csv_path = output_dir / 'trello-board.csv'
+    export_trello(board_id='bench', csv_path=csv_path, trello=trello,
+                  users_mapping=users_mapping, **kwargs)
+    with open(csv_path, 'r', encoding='utf-8') as file:
+        # Exclude the header
+        return sum(1 for _ in file) - 1
+
+
+def run_youtrack(server: FakeServerProcess,
+                 scenario: str,
+                 max_workers: int,
+                 rate: float) -> int:
+    youtrack = YouTrack(api_base_url=server.url, perm_token='bench',
+                        governor=RateGovernor(rate=rate, burst=max_workers,
+                                              backoff_base=0.1))
+    if scenario == 'youtrack-iter-issues':
+        return sum(1 for _ in youtrack.iter_issues())
+    changes = {issue['idReadable']: {'Story points': i % 5, 'State': 'Done'}
+               for i, issue in enumerate(server.board.issues)}
+    youtrack.update_issues_bulk(changes, max_workers=max_workers)
+    return len(changes)
+
+
+def run_attachments(server: FakeServerProcess,
+                    scenario: str,
+                    output_dir: pathlib.Path,
+                    max_workers: int,
+                    rate: float) -> int:
+    governor = RateGovernor(rate=rate, burst=max_workers, backoff_base=0.1)
+    csv_path = output_dir / 'trello-attachments.csv'
+    if scenario == 'attachments-download':
+        trello = Trello(api_base_url=f'{server.url}/1',
+                        api_key='bench', api_token='bench',
+                        max_workers=max_workers, governor=governor)
+        export_attachments(board_id='bench',
+                           directory=output_dir / 'attachments',
+                           csv_path=csv_path, trello=trello)
+        return len(list(Trello.read_board_csv(csv_path)))
+    youtrack = YouTrack(api_base_url=server.url, perm_token='bench',
+                        governor=governor)
+    attachments = [(f'BENCH-{row["Card"]}', row['Path'], row['Name'])
+                   for row in Trello.read_board_csv(csv_path)]
+    youtrack.upload_attachments_bulk(attachments, max_workers=max_workers)
+    return len(attachments)
+
+
+def run_transform(board: SyntheticBoard, scenario: str) -> int:
+    users_mapping = {member['username']: member['username']
+                     for member in board.members}
+    resources = get_board_resources(board)
+    return len(TRANSFORM_SCENARIOS[scenario](*resources, users_mapping))
+
+
+def print_report(results: list) -> None:
+    print(f'{"scenario":<24}{"wall (s)":>10}{"requests":>10}'
+          f'{"429s":>8}{"peak (MB)":>11}{"rows/s":>11}')
+    for result in results:
+        print(f'{result["scenario"]:<24}{result["wall_time"]:>10.2f}'
+              f'{result["requests"]:>10}{result["throttled"]:>8}'
+              f'{result["peak_memory_mb"]:>11.1f}'
+              f'{result["rows_per_second"]:>11.0f}')
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description='Benchmark the exporter and the YouTrack client against '
+                    'a local stand-in of the Trello and YouTrack APIs.'
+    )
+    parser.add_argument('--cards', type=int, default=1000,
+                        help='number of cards of the synthetic board')
+    parser.add_argument('--members', type=int, default=20,
+                        help='number of members of the synthetic board')
+    parser.add_argument('--card-members', type=int, default=3,
+                        help='maximum number of members per card')
+    parser.add_argument('--actions-per-card', type=int, default=3,
+                        help='number of actions per card')
+    parser.add_argument('--description-size', type=int, default=500,
+                        help='number of characters per card description')
+    parser.add_argument('--attachments-per-card', type=int, default=2,
+                        help='number of files attached per card')
+    parser.add_argument('--attachment-size', type=int, default=16 * 1024,
+                        help='size in bytes of the attached files')
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='latency in seconds added to every response')
+    parser.add_argument('--throttle', type=float, default=0.0,
+                        help='ratio of the requests rejected with 429')
+    parser.add_argument('--max-workers', type=int, default=8,
+                        help='number of concurrent requests of the clients')
+    parser.add_argument('--rate', type=float, default=None,
+                        help='requests per second of the rate governor '
+                             '(unlimited if not given)')
+    parser.add_argument('--scenarios', nargs='+',
+                        choices=[*EXPORT_SCENARIOS, *YOUTRACK_SCENARIOS,
+                                 *ATTACHMENT_SCENARIOS, *TRANSFORM_SCENARIOS],
+                        default=[*EXPORT_SCENARIOS, *YOUTRACK_SCENARIOS,
+                                 *ATTACHMENT_SCENARIOS, *TRANSFORM_SCENARIOS],
+                        help='scenarios to run')
+    parser.add_argument('--json', metavar='PATH',
+                        help='also write the results to this JSON file')
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    board = SyntheticBoard(cards=args.cards,
+                           members=args.members,
+                           max_card_members=args.card_members,
+                           actions_per_card=args.actions_per_card,
+                           description_size=args.description_size,
+                           attachments_per_card=args.attachments_per_card,
+                           attachment_size=args.attachment_size)
+    results = []
+    # The server runs in a child process, out of the traced allocations
+    with FakeServerProcess(board, latency=args.latency,
+                           throttle=args.throttle) as server, \
+            tempfile.TemporaryDirectory() as output_dir:
+        for scenario in args.scenarios:
+            if scenario in EXPORT_SCENARIOS:
+                run = lambda: run_export(server, board,
+                                         pathlib.Path(output_dir),
+                                         args.max_workers, args.rate,
+                                         **EXPORT_SCENARIOS[scenario])
+            elif scenario in ATTACHMENT_SCENARIOS:
+                if (scenario == 'attachments-upload' and not pathlib.Path(
+                        output_dir, 'trello-attachments.csv').exists()):
+                    # The uploads read the downloaded files
+                    run_attachments(server, 'attachments-download',
+                                    pathlib.Path(output_dir),
+                                    args.max_workers, args.rate)
+                run = lambda: run_attachments(server, scenario,
+                                              pathlib.Path(output_dir),
+                                              args.max_workers, args.rate)
+            elif scenario in TRANSFORM_SCENARIOS:
+                run = lambda: run_transform(board, scenario)
+            else:
+                run = lambda: run_youtrack(server, scenario,
+                                           args.max_workers, args.rate)
+            results.append(measure(server, scenario, run))
+    print_report(results)
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
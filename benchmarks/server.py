@@ -0,0 +1,533 @@
+import json
+import multiprocessing
+import random
+import re
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from multiprocessing.connection import Connection
+from typing import List, Dict, Any, Optional, Tuple
+from urllib.parse import urlparse, parse_qs, unquote
+
+import requests
+
+from src.trcsvyt.trello import AGILE_TOOLS_PLUGIN_ID, ACTION_TYPES
+from src.trcsvyt.webhook import send_webhook
+
+
+class SyntheticBoard:
+    def __init__(self,
+                 cards: int = 1000,
+                 lists: int = 10,
+                 members: int = 20,
+                 max_card_members: int = 3,
+                 actions_per_card: int = 3,
+                 description_size: int = 500,
+                 attachments_per_card: int = 0,
+                 attachment_size: int = 64 * 1024,
+                 issues: int = None,
+                 seed: int = 0):
+        """
+        Synthetic Trello board, and the YouTrack Issues imported from it.
+
+        :param cards: Number of cards
+        :param lists: Number of lists
+        :param members: Number of board members
+        :param max_card_members: Maximum number of members per card
+        :param actions_per_card: Number of actions per card (one creation and
+            the rest updates and comments)
+        :param description_size: Number of characters per card description
+        :param attachments_per_card: Number of files attached per card (a
+            quarter of them duplicates of the others)
+        :param attachment_size: Size in bytes of the attached files
+        :param issues: Number of YouTrack Issues (defaults to the cards)
+        :param seed: Seed of the random generator
+        """
+        rng = random.Random(seed)
+        self.lists = [{'id': f'{i:024x}', 'name': f'Sprint {i}',
+                       'closed': False, 'pos': i}
+                      for i in range(lists)]
+        self.members = [{'id': f'{i:024x}', 'username': f'user{i}',
+                         'fullName': f'User {i}'}
+                        for i in range(members)]
+        self.cards = []
+        self.actions = []
+        self.plugin_data = {}
+        for i in range(cards):
+            card_members = rng.sample(self.members,
+                                      rng.randint(0, max_card_members))
+            card = {'id': f'{0x600000000000000000000000 + i:024x}',
+                    'shortLink': f'c{i:07d}',
+                    'idShort': i + 1,
+                    'name': f'Card {i + 1}',
+                    'desc': ''.join(rng.choices('abcdef ',
+                                                k=description_size)),
+                    'due': rng.choice([None, '2024-01-31T12:00:00.000Z']),
+                    'closed': False,
+                    'idBoard': 'bench',
+                    'idList': rng.choice(self.lists)['id'],
+                    'idMembers': [member['id'] for member in card_members]}
+            self.cards.append(card)
+            self.plugin_data[card['id']] = [{
+                'id': f'{i:024x}',
+                'idPlugin': AGILE_TOOLS_PLUGIN_ID,
+                'scope': 'card',
+                'idModel': card['id'],
+                'value': json.dumps({'points': rng.choice([1, 2, 3, 5, 8])}),
+            }]
+            for j in range(actions_per_card):
+                action_type = (ACTION_TYPES['create_card'] if j == 0
+                               else rng.choice([ACTION_TYPES['update_card'],
+                                                ACTION_TYPES['comment_card']]))
+                creator = rng.choice(self.members)
+                self.actions.append({
+                    'id': f'{0x700000000000000000000000 + j * cards + i:024x}',
+                    'type': action_type,
+                    'date': '2024-01-01T00:00:00.000Z',
+                    'idMemberCreator': creator['id'],
+                    'memberCreator': {'id': creator['id'],
+                                      'username': creator['username']},
+                    'data': {'card': {'id': card['id'],
+                                      'shortLink': card['shortLink'],
+                                      'idShort': card['idShort'],
+                                      'name': card['name']},
+                             'text': f'Comment {j}'},
+                })
+        self.actions.sort(key=lambda action: action['id'], reverse=True)
+
+        self.cards_by_short_link = {card['shortLink']: card
+                                    for card in self.cards}
+        self.cards_by_short_link.update({card['id']: card
+                                         for card in self.cards})
+        self.lists_by_id = {list_['id']: list_ for list_ in self.lists}
+        self.members_by_id = {member['id']: member
+                              for member in self.members}
+        self.card_actions = {}
+        for action in self.actions:
+            self.card_actions.setdefault(action['data']['card']['id'],
+                                         []).append(action)
+
+        self.rng = rng
+
+        self.attachments = {}
+        self.attachment_contents = {}
+        for card in self.cards:
+            card['attachments'] = []
+            for j in range(attachments_per_card):
+                number = len(self.attachments)
+                attachment_id = f'{0x900000000000000000000000 + number:024x}'
+                self.attachments[attachment_id] = card
+                # Every fourth file duplicates the previous one
+                content_number = number - 1 if number % 4 == 3 else number
+                self.attachment_contents[attachment_id] = (
+                    f'{content_number:08d}'.encode('ascii')
+                    * (attachment_size // 8)
+                )
+                card['attachments'].append({
+                    'id': attachment_id,
+                    'name': f'file-{j}.bin',
+                    'url': f'/download/{card["id"]}/{attachment_id}',
+                    'bytes': attachment_size,
+                    'mimeType': 'application/octet-stream',
+                    'isUpload': True,
+                })
+
+        self.issues = [{'id': f'2-{i}',
+                        'idReadable': f'BENCH-{i + 1}',
+                        'summary': f'Card {i + 1}',
+                        'description': None,
+                        'created': i,
+                        'updated': i,
+                        'customFields': [
+                            {'id': '192-57', 'name': 'Story points',
+                             '$type': 'SimpleIssueCustomField',
+                             'value': float(rng.choice([1, 2, 3, 5, 8]))},
+                            {'id': '192-58', 'name': 'State',
+                             '$type': 'StateIssueCustomField',
+                             'value': {'name': 'Done'}},
+                        ]}
+                       for i in range(cards if issues is None else issues)]
+
+    def update_card(self, short_link: str, **changes) -> Dict[str, Any]:
+        """
+        Changes the given card, e.g. `name`, and returns the recorded action.
+        """
+        card = self.cards_by_short_link[short_link]
+        card.update(changes)
+        creator = self.rng.choice(self.members)
+        action = {
+            'id': f'{0x800000000000000000000000 + len(self.actions):024x}',
+            'type': ACTION_TYPES['update_card'],
+            'date': '2024-02-01T00:00:00.000Z',
+            'idMemberCreator': creator['id'],
+            'memberCreator': {'id': creator['id'],
+                              'username': creator['username']},
+            'data': {'card': {'id': card['id'],
+                              'shortLink': card['shortLink'],
+                              'idShort': card['idShort'],
+                              'name': card['name']}},
+        }
+        self.actions.insert(0, action)
+        self.card_actions.setdefault(card['id'], []).insert(0, action)
+        return action
+
+
+def project(item: Dict[str, Any], fields: Optional[str]) -> Dict[str, Any]:
+    if not fields or fields == 'all':
+        return dict(item)
+    names = fields.split(',')
+    return {name: item[name] for name in ['id', *names] if name in item}
+
+
+def paginate(items: List[Dict[str, Any]],
+             params: Dict[str, str],
+             newest_first: bool) -> List[Dict[str, Any]]:
+    if 'before' in params:
+        items = [item for item in items if item['id'] < params['before']]
+    if 'since' in params:
+        items = [item for item in items if item['id'] > params['since']]
+    limit = int(params.get('limit', 1000))
+    return items[:limit] if newest_first else items[-limit:]
+
+
+class FakeServer:
+    def __init__(self,
+                 board: SyntheticBoard,
+                 latency: float = 0.0,
+                 throttle: float = 0.0,
+                 retry_after: float = 0.1,
+                 secret: str = 'bench',
+                 seed: int = 0):
+        """
+        Local stand-in of the Trello and YouTrack REST APIs serving the given
+        synthetic board, in a background thread.
+
+        :param board: Synthetic board to serve
+        :param latency: Latency in seconds added to every response
+        :param throttle: Ratio of the requests to reject with `429`
+        :param retry_after: `Retry-After` in seconds of the throttled requests
+        :param secret: API secret the webhook callbacks are signed with
+        :param seed: Seed of the random generator of the throttling
+        """
+        self.board = board
+        self.latency = latency
+        self.throttle = throttle
+        self.retry_after = retry_after
+        self.secret = secret
+        self.rng = random.Random(seed)
+
+        self.lock = threading.Lock()
+        self.requests_count = 0
+        self.throttled_count = 0
+        self.commands = []
+        self.webhooks = {}
+        self.uploads = []
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                server.handle(self, 'GET')
+
+            def do_POST(self):
+                server.handle(self, 'POST')
+
+            def do_DELETE(self):
+                server.handle(self, 'DELETE')
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever,
+                                       daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f'http://127.0.0.1:{self.httpd.server_port}'
+
+    def __enter__(self) -> 'FakeServer':
+        self.thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def reset_counters(self) -> None:
+        with self.lock:
+            self.requests_count = 0
+            self.throttled_count = 0
+
+    def handle(self, handler: BaseHTTPRequestHandler, method: str) -> None:
+        length = int(handler.headers.get('Content-Length') or 0)
+        body = handler.rfile.read(length) if length else b''
+        with self.lock:
+            self.requests_count += 1
+            throttled = self.rng.random() < self.throttle
+            if throttled:
+                self.throttled_count += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if throttled:
+            self.reply(handler, 429, {'message': 'Rate limit exceeded'},
+                       {'Retry-After': str(self.retry_after)})
+            return
+
+        url = urlparse(handler.path)
+        params = {name: values[0]
+                  for name, values in parse_qs(url.query).items()}
+        if method == 'GET' and url.path == '/1/batch':
+            # Each route is URL-encoded, and the routes are comma-separated
+            routes = re.search(r'(?:^|&)urls=([^&]*)', url.query).group(1)
+            result = []
+            for route in routes.split(','):
+                route = urlparse(unquote(route))
+                route_params = {name: values[0] for name, values
+                                in parse_qs(route.query).items()}
+                entry = self.route_trello(route.path, route_params)
+                result.append({'200': entry} if entry is not None else
+                              {'statusCode': 404, 'message': 'Not found'})
+            self.reply(handler, 200, result)
+            return
+        if method == 'GET' and url.path.startswith('/download/'):
+            content = self.board.attachment_contents.get(
+                url.path.split('/')[-1]
+            )
+            if content is None:
+                self.reply(handler, 404, {'message': 'Not found'})
+            else:
+                handler.send_response(200)
+                handler.send_header('Content-Type',
+                                    'application/octet-stream')
+                handler.send_header('Content-Length', str(len(content)))
+                handler.end_headers()
+                handler.wfile.write(content)
+            return
+        if method == 'POST' and url.path.endswith('/attachments'):
+            # YouTrack only accepts the files as multipart form data
+            content_type = handler.headers.get('Content-Type') or ''
+            boundary = content_type.partition('boundary=')[2]
+            delimiter = f'--{boundary}'.encode('ascii')
+            if (not content_type.startswith('multipart/form-data')
+                    or not boundary or not body.startswith(delimiter)):
+                self.reply(handler, 415,
+                           {'message': f'Unsupported Content-Type '
+                                       f'{content_type}'})
+                return
+        if url.path.startswith('/1/webhooks'):
+            result = self.route_webhooks(method, url.path[len('/1'):], params)
+        elif method == 'GET' and url.path.startswith('/1/'):
+            result = self.route_trello(url.path[len('/1'):], params)
+        else:
+            result = self.route_youtrack(method, url.path, params, body)
+        if result is None:
+            self.reply(handler, 404, {'message': 'Not found'})
+        else:
+            self.reply(handler, 200, result)
+
+    @staticmethod
+    def reply(handler: BaseHTTPRequestHandler,
+              status: int,
+              result: Any,
+              headers: Dict[str, str] = None) -> None:
+        data = json.dumps(result).encode('utf-8')
+        handler.send_response(status)
+        handler.send_header('Content-Type', 'application/json')
+        handler.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            handler.send_header(name, value)
+        handler.end_headers()
+        handler.wfile.write(data)
+
+    def route_trello(self, path: str, params: Dict[str, str]) -> Any:
+        board = self.board
+        parts = path.strip('/').split('/')
+        if parts[0] == 'organizations' and parts[2:] == ['boards']:
+            return [{'id': 'bench', 'name': 'Bench', 'shortLink': 'bench'}]
+        if parts[0] == 'boards' and len(parts) == 3:
+            resource = parts[2]
+            if resource == 'cards':
+                cards = paginate(board.cards, params, newest_first=False)
+                return [self.nest_card(card, params) for card in cards]
+            if resource == 'lists':
+                return [project(list_, params.get('fields'))
+                        for list_ in board.lists]
+            if resource == 'members':
+                return [project(member, params.get('fields'))
+                        for member in board.members]
+            if resource == 'actions':
+                actions = board.actions
+                if params.get('filter', 'all') != 'all':
+                    types = params['filter'].split(',')
+                    actions = [action for action in actions
+                               if action['type'] in types]
+                return paginate(actions, params, newest_first=True)
+        if parts[0] == 'cards' and len(parts) in (2, 3):
+            card = board.cards_by_short_link.get(parts[1])
+            if card is None:
+                return None
+            if len(parts) == 2:
+                return self.nest_card(card, params)
+            resource = parts[2]
+            if resource == 'list':
+                return project(board.lists_by_id[card['idList']],
+                               params.get('fields'))
+            if resource == 'members':
+                return [project(board.members_by_id[member_id],
+                                params.get('fields'))
+                        for member_id in card['idMembers']]
+            if resource == 'pluginData':
+                return board.plugin_data[card['id']]
+            if resource == 'actions':
+                actions = board.card_actions.get(card['id'], [])
+                if params.get('filter'):
+                    types = params['filter'].split(',')
+                    actions = [action for action in actions
+                               if action['type'] in types]
+                return actions[:int(params.get('limit', 50))]
+        return None
+
+    def route_webhooks(self, method: str, path: str,
+                       params: Dict[str, str]) -> Any:
+        parts = path.strip('/').split('/')
+        if method == 'POST' and len(parts) == 1:
+            # Trello only registers callback URLs answering a HEAD request
+            if not requests.head(params['callbackURL']).ok:
+                return None
+            with self.lock:
+                webhook = {'id': f'{len(self.webhooks) + 1:024x}',
+                           'callbackURL': params['callbackURL'],
+                           'idModel': params['idModel'],
+                           'description': params.get('description', ''),
+                           'active': True}
+                self.webhooks[webhook['id']] = webhook
+            return webhook
+        if method == 'DELETE' and len(parts) == 2:
+            with self.lock:
+                webhook = self.webhooks.pop(parts[1], None)
+            return None if webhook is None else {}
+        return None
+
+    def notify(self, action: Dict[str, Any]) -> int:
+        """
+        Calls the registered webhooks back with the given action, and returns
+        the number of the accepted callbacks.
+        """
+        with self.lock:
+            webhooks = list(self.webhooks.values())
+        accepted = 0
+        for webhook in webhooks:
+            response = send_webhook(webhook['callbackURL'], self.secret, {
+                'action': action,
+                'model': {'id': webhook['idModel']},
+            })
+            accepted += response.ok
+        return accepted
+
+    def nest_card(self, card: Dict[str, Any],
+                  params: Dict[str, str]) -> Dict[str, Any]:
+        result = project(card, params.get('fields'))
+        result.pop('attachments', None)
+        if params.get('attachments') == 'true':
+            result['attachments'] = [
+                project({**attachment, 'url': self.url + attachment['url']},
+                        params.get('attachment_fields'))
+                for attachment in card['attachments']
+            ]
+        if params.get('members') == 'true':
+            result['members'] = [
+                project(self.board.members_by_id[member_id],
+                        params.get('member_fields'))
+                for member_id in card['idMembers']
+            ]
+        if params.get('pluginData') == 'true':
+            result['pluginData'] = self.board.plugin_data[card['id']]
+        return result
+
+    def route_youtrack(self, method: str, path: str,
+                       params: Dict[str, str], body: bytes) -> Any:
+        board = self.board
+        if method == 'GET' and path == '/api/issues':
+            skip = int(params.get('$skip', 0))
+            top = int(params.get('$top', len(board.issues)))
+            return board.issues[skip:skip + top]
+        if method == 'GET' and path == '/api/admin/projects':
+            return [{'id': '0-1', 'shortName': 'BENCH', 'name': 'Bench'}]
+        if method == 'POST' and path == '/api/commands':
+            with self.lock:
+                self.commands.append(json.loads(body))
+            return {}
+        match = re.fullmatch(r'/api/issues/([\w-]+)/attachments', path)
+        if method == 'POST' and match:
+            with self.lock:
+                self.uploads.append((match.group(1), len(body)))
+            return [{'id': f'{len(self.uploads)}'}]
+        match = re.fullmatch(r'/api/issues/([\w-]+)', path)
+        if method == 'POST' and match:
+            return {'id': match.group(1)}
+        return None
+
+
+def serve_process(board: SyntheticBoard,
+                  connection: Connection,
+                  kwargs: Dict[str, Any]) -> None:
+    """
+    Serves the given board from a child process, answering the commands of
+    the parent process received through the given connection.
+    """
+    with FakeServer(board, **kwargs) as server:
+        connection.send(server.url)
+        while True:
+            command = connection.recv()
+            if command == 'close':
+                break
+            if command == 'reset':
+                server.reset_counters()
+            connection.send((server.requests_count, server.throttled_count))
+
+
+class FakeServerProcess:
+    def __init__(self, board: SyntheticBoard, **kwargs):
+        """
+        Fake server running in a child process, so that its allocations stay
+        out of the memory measured in this one.
+
+        :param board: Synthetic board to serve (copied to the child process)
+        :param kwargs: Keyword arguments of `FakeServer`
+        """
+        self.board = board
+        self.connection, child_connection = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(
+            target=serve_process, args=(board, child_connection, kwargs),
+            daemon=True
+        )
+        self.url = None
+
+    def __enter__(self) -> 'FakeServerProcess':
+        self.process.start()
+        self.url = self.connection.recv()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.connection.send('close')
+        self.process.join()
+
+    def reset_counters(self) -> None:
+        self.connection.send('reset')
+        self.connection.recv()
+
+    def get_counters(self) -> Tuple[int, int]:
+        self.connection.send('counters')
+        return self.connection.recv()
+
+    @property
+    def requests_count(self) -> int:
+        return self.get_counters()[0]
+
+    @property
+    def throttled_count(self) -> int:
+        return self.get_counters()[1]
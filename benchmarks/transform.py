@@ -0,0 +1,88 @@
+from typing import List, Dict, Any, Tuple
+
+from benchmarks.server import SyntheticBoard
+from scripts.exporter import RESOLVED_STATE, build_board
+from src.trcsvyt.trello import Trello
+
+
+def get_board_resources(
+        board: SyntheticBoard
+) -> Tuple[List[Dict[str, Any]],
+           Dict[str, Dict[str, Any]],
+           Dict[str, List[Dict[str, Any]]],
+           Dict[str, List[Dict[str, Any]]],
+           Dict[str, List[Dict[str, Any]]]]:
+    """
+    Returns the cards of the given board and the mappings of card Short Links
+    to the list, actions, members and Power-Ups as fetched by the exporter.
+    """
+    cards = board.cards
+    return (cards,
+            {card['shortLink']: board.lists_by_id[card['idList']]
+             for card in cards},
+            {card['shortLink']: board.card_actions.get(card['id'], [])
+             for card in cards},
+            {card['shortLink']: [board.members_by_id[member_id]
+                                 for member_id in card['idMembers']]
+             for card in cards},
+            {card['shortLink']: board.plugin_data[card['id']]
+             for card in cards})
+
+
+def build_board_legacy(
+        cards: List[Dict[str, Any]],
+        list_mapping: Dict[str, Dict[str, Any]],
+        actions_mapping: Dict[str, List[Dict[str, Any]]],
+        members_mapping: Dict[str, List[Dict[str, Any]]],
+        powerups_mapping: Dict[str, List[Dict[str, Any]]],
+        users_mapping: Dict[str, str]
+) -> List[Dict[str, str]]:
+    """
+    The former row builder, parsing every card field once per assignee, and
+    then sorting the rows by their parsed IDs.
+    """
+    board = []
+    for card in cards:
+        card_id = card['shortLink']
+        assignees = Trello.parse_card_assignees_username(
+            members_mapping[card_id]
+        )
+        for i, assignee in enumerate(assignees):
+            row = {}
+            row['ID'] = Trello.parse_card_number(card, i)
+            (row['Author'],
+             row['Created']) = Trello.parse_card_creator_username_and_date(
+                actions_mapping[card_id], users_mapping
+            )
+            row['Summary'] = Trello.parse_card_summary(card)
+            row['Description'] = Trello.parse_card_description(card)
+            row['State (state)'] = RESOLVED_STATE
+            row['Sprint (version)'] = Trello.parse_card_list(
+                list_mapping[card_id]
+            )
+            row['Story Points (integer)'] = Trello.parse_story_points(
+                powerups_mapping[card_id]
+            )
+            row['Assignee (user)'] = users_mapping.get(assignee, '')
+            row['Due Date (date)'] = Trello.parse_card_due(card)
+
+            board.append(row)
+    return Trello.sort_board(board)
+
+
+def build_board_single_pass(
+        cards: List[Dict[str, Any]],
+        list_mapping: Dict[str, Dict[str, Any]],
+        actions_mapping: Dict[str, List[Dict[str, Any]]],
+        members_mapping: Dict[str, List[Dict[str, Any]]],
+        powerups_mapping: Dict[str, List[Dict[str, Any]]],
+        users_mapping: Dict[str, str]
+) -> List[Dict[str, str]]:
+    """
+    The exporter row builder, parsing every card once and sorting the cards
+    by their numeric keys before fanning them out to rows.
+    """
+    cards = Trello.parse_cards(cards, list_mapping, actions_mapping,
+                               members_mapping, powerups_mapping,
+                               users_mapping)
+    return list(build_board(Trello.sort_cards(cards)))
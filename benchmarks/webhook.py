@@ -0,0 +1,112 @@
+import argparse
+import pathlib
+import socket
+import tempfile
+import time
+from typing import Dict, Any
+
+from benchmarks.server import SyntheticBoard, FakeServer
+from scripts.mirror import Mirror
+from src.trcsvyt.trello import Trello
+from src.trcsvyt.webhook import send_webhook
+
+
+def get_free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def simulate_mirror(board: SyntheticBoard,
+                    output_dir: pathlib.Path,
+                    bursts: int,
+                    burst_size: int,
+                    debounce: float) -> Dict[str, Any]:
+    """
+    Mirrors the synthetic board through a webhook registered on the fake
+    server, changes some cards in bursts of callbacks, and checks the mirrored
+    board against the changes.
+
+    :param board: Synthetic board to mirror
+    :param output_dir: Directory of the mirrored board
+    :param bursts: Number of changed cards, one burst of callbacks each
+    :param burst_size: Number of changes per card
+    :param debounce: Time in seconds without changes to wait for before
+        applying them
+    :return: Metrics of the simulation
+    """
+    with FakeServer(board) as server:
+        trello = Trello(api_base_url=f'{server.url}/1',
+                        api_key='bench', api_token='bench')
+        users_mapping = {member['username']: member['username']
+                         for member in board.members}
+        port = get_free_port()
+        callback_url = f'http://127.0.0.1:{port}/'
+        csv_path = output_dir / 'trello-board.csv'
+        with Mirror(callback_url=callback_url, port=port, board_id='bench',
+                    csv_path=csv_path, debounce=debounce,
+                    secret=server.secret, trello=trello,
+                    users_mapping=users_mapping) as mirror:
+            server.reset_counters()
+            started_at = time.perf_counter()
+            changed_cards = board.cards[::max(len(board.cards) // bursts, 1)]
+            changed_cards = changed_cards[:bursts]
+            callbacks = 0
+            for card in changed_cards:
+                for i in range(burst_size):
+                    action = board.update_card(card['shortLink'],
+                                               name=f'Renamed {i}')
+                    callbacks += server.notify(action)
+            # A forged callback is rejected
+            forged = send_webhook(callback_url, 'forged',
+                                  {'action': action, 'model': {}})
+        # Closing the mirror applies the pending changes
+        wall_time = time.perf_counter() - started_at
+
+        # Only the cards with members are exported, a row per member
+        expected = {card['idShort']: f'Renamed {burst_size - 1}'
+                    for card in changed_cards if card['idMembers']}
+        mirrored = {int(row['ID'].split('-')[0]): row['Summary']
+                    for row in trello.read_board(csv_path)}
+        mismatches = sum(1 for number, summary in expected.items()
+                         if mirrored.get(number) != summary)
+        return {'callbacks': callbacks,
+                'forged_status': forged.status_code,
+                'rejected': mirror.receiver.rejected_count,
+                'applied_batches': mirror.applied_count,
+                'requests': server.requests_count,
+                'wall_time': wall_time,
+                'webhooks_left': len(server.webhooks),
+                'mismatches': mismatches}
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description='Simulate the webhook-driven live mirror against a local '
+                    'stand-in of the Trello API.'
+    )
+    parser.add_argument('--cards', type=int, default=200,
+                        help='number of cards of the synthetic board')
+    parser.add_argument('--bursts', type=int, default=5,
+                        help='number of changed cards')
+    parser.add_argument('--burst-size', type=int, default=10,
+                        help='number of changes per card')
+    parser.add_argument('--debounce', type=float, default=0.5,
+                        help='seconds without changes to wait for before '
+                             'applying them')
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    board = SyntheticBoard(cards=args.cards)
+    with tempfile.TemporaryDirectory() as output_dir:
+        result = simulate_mirror(board, pathlib.Path(output_dir),
+                                 args.bursts, args.burst_size, args.debounce)
+    for name, value in result.items():
+        print(f'{name:<20}{value:>10.2f}' if isinstance(value, float)
+              else f'{name:<20}{value:>10}')
+
+
+if __name__ == '__main__':
+    main()
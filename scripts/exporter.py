@@ -1,11 +1,27 @@
+import argparse
+import json
 import os
+import pathlib
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from typing import (List, Dict, Any, Iterator, Iterable, Tuple, Set, Union,
+                    ContextManager)
 
+from src.trcsvyt.cache import ResponseCache
+from src.trcsvyt.formats import (OUTPUT_FORMATS, COMPRESSIONS, get_output_path,
+                                 read_board)
+from src.trcsvyt.journal import Journal
 from src.trcsvyt.logger import Logger
+from src.trcsvyt.metrics import Metrics
+from src.trcsvyt.models import Card, BoardIndex
 from src.trcsvyt.trello import Trello
 
 TRELLO_API_KEY = os.getenv('TRELLO_API_KEY')
 TRELLO_API_TOKEN = os.getenv('TRELLO_API_TOKEN')
 TRELLO_BOARD_ID = os.getenv('TRELLO_BOARD_ID')
+TRELLO_BOARD_WORKERS = int(os.getenv('TRELLO_BOARD_WORKERS', 4))
+TRELLO_MAX_WORKERS = int(os.getenv('TRELLO_MAX_WORKERS', 8))
+TRELLO_BATCH_SIZE = int(os.getenv('TRELLO_BATCH_SIZE', 10))
 
 CSV_HEADER = [
     'ID', 'Author', 'Created', 'Summary', 'Description',
@@ -15,51 +31,566 @@ CSV_HEADER = [
 
 RESOLVED_STATE = 'Done'
 
+CACHE_DIR = 'assets/.cache'
+
 USERS_CSV_PATH = 'assets/users.csv'
 EXPORT_CSV_PATH = 'assets/trello-board.csv'
+# Per board CSV of a multi-board export
+BOARD_CSV_PATH = 'assets/trello-board-{board_id}.csv'
 
+# Downloaded card attachments, stored once per content hash, along with the
+# manifest mapping them to their cards
+ATTACHMENTS_DIR = 'assets/attachments'
+ATTACHMENTS_CSV_PATH = 'assets/trello-attachments.csv'
+ATTACHMENTS_CSV_HEADER = ['ID', 'Card', 'Name', 'SHA-256', 'Path']
 
-def export_trello():
-    trello = Trello(api_key=TRELLO_API_KEY, api_token=TRELLO_API_TOKEN)
-    users_mapping = trello.read_users_mapping(USERS_CSV_PATH)
+# Characters beyond which the logging records (e.g. the dumped cards) are
+# truncated
+LOG_RECORD_SIZE = 2000
 
-    cards = trello.get_board_cards(TRELLO_BOARD_ID)
-    list_mapping = trello.get_card_list_bulk(cards)
-    actions_mapping = trello.get_cards_actions_bulk(cards)
-    members_mapping = trello.get_cards_members_bulk(cards)
-    powerups_mapping = trello.get_cards_powerups_bulk(cards)
+# Fields of the cards enough to detect the changed and removed ones, and to
+# resolve their lists
+CARD_INDEX_FIELDS = ['id', 'idShort', 'shortLink', 'idList']
 
-    board = []
+# Fields of the resources read by the export, so that the unused ones are
+# neither transferred nor held in memory
+EXPORT_CARD_FIELDS = ['id', 'idShort', 'shortLink', 'name', 'desc', 'due',
+                      'idList', 'idMembers']
+EXPORT_LIST_FIELDS = ['name']
+EXPORT_MEMBER_FIELDS = ['username']
+EXPORT_ACTION_FIELDS = ['type', 'date']
+EXPORT_ACTION_TYPES = ['createCard']
+
+
+def build_rows(cards: Iterable[Card]) -> Iterator[Tuple[int, Dict[str, str]]]:
+    """
+    Fans the given cards out to a row per Card Member, each along with the
+    Card number as its numeric sort key.
+    The fields shared by the rows of a card are computed once per card.
+
+    :param cards: Iterable of the parsed cards
+    :return: Iterator of the sort keys and rows
+    """
     for card in cards:
-        card_id = card['shortLink']
-        assignees = trello.parse_card_assignees_username(
-            members_mapping[card_id]
-        )
+        shared_row = {
+            'Author': card.author,
+            'Created': card.created,
+            'Summary': card.summary,
+            'Description': card.description,
+            'State (state)': RESOLVED_STATE,  # Consider past Cards Done
+            'Sprint (version)': card.sprint,
+            'Story Points (integer)': card.story_points,
+            'Due Date (date)': card.due,
+        }
         # Duplicate row per Card Members with the same info but the assignee
-        for i, assignee in enumerate(assignees):
-            row = {}
-            row['ID'] = trello.parse_card_number(card, i)
-            (row['Author'],
-             row['Created']) = trello.parse_card_creator_username_and_date(
-                actions_mapping[card_id], users_mapping
-            )
-            row['Summary'] = trello.parse_card_summary(card)
-            row['Description'] = trello.parse_card_description(card)
-            row['State (state)'] = RESOLVED_STATE  # Consider past Cards Done
-            row['Sprint (version)'] = trello.parse_card_list(
-                list_mapping[card_id]
-            )
-            row['Story Points (integer)'] = trello.parse_story_points(
-                powerups_mapping[card_id]
-            )
-            row['Assignee (user)'] = users_mapping.get(assignee, '')
-            row['Due Date (date)'] = trello.parse_card_due(card)
-
-            board.append(row)
-    board = trello.sort_board(board)
-    trello.export_board_csv(board, EXPORT_CSV_PATH, CSV_HEADER)
+        for i, assignee in enumerate(card.assignees):
+            row = shared_row.copy()
+            row['ID'] = f'{card.id_short}-{i}'
+            row['Assignee (user)'] = assignee
+            yield card.number, row
+
+
+def build_board(cards: Iterable[Card]) -> Iterator[Dict[str, str]]:
+    return (row for _, row in build_rows(cards))
+
+
+def fetch_cards(trello: Trello,
+                cards: List[Dict[str, Any]],
+                users_mapping: Dict[str, str],
+                board_index: BoardIndex,
+                journal: Journal = None) -> List[Card]:
+    """
+    Retrieves the resources of the given cards and parses them into Cards.
+
+    :param trello: Trello adapter
+    :param cards: List of the cards
+    :param users_mapping: Mapping of Trello to YouTrack usernames
+    :param board_index: Index of the board to resolve the card lists and
+        members from
+    :param journal: Journal of the retrieved resources to resume from
+    :return: List of the parsed cards
+    """
+    return trello.parse_cards(
+        cards,
+        *trello.get_cards_details_bulk(cards,
+                                       list_fields=EXPORT_LIST_FIELDS,
+                                       action_types=EXPORT_ACTION_TYPES,
+                                       member_fields=EXPORT_MEMBER_FIELDS,
+                                       action_fields=EXPORT_ACTION_FIELDS,
+                                       board_index=board_index,
+                                       journal=journal),
+        users_mapping
+    )
+
+
+def get_board_index(trello: Trello, board_id: str) -> BoardIndex:
+    return trello.get_board_index(board_id,
+                                  list_fields=EXPORT_LIST_FIELDS,
+                                  member_fields=EXPORT_MEMBER_FIELDS)
+
+
+def stream_board(
+        trello: Trello,
+        board_id: str,
+        users_mapping: Dict[str, str],
+        journal: Journal = None
+) -> Iterator[Tuple[int, Dict[str, str]]]:
+    """
+    Yields the board rows page by page of cards, so that only a single page
+    of cards along with its resources is held in memory at a time.
+
+    :param trello: Trello adapter
+    :param board_id: ID of the board
+    :param users_mapping: Mapping of Trello to YouTrack usernames
+    :param journal: Journal of the retrieved resources to resume from
+    :return: Iterator of the (unsorted) board rows along with their sort
+        keys
+    """
+    board_index = get_board_index(trello, board_id)
+    for cards in trello.iter_paginated(
+            f'/boards/{board_id}/cards',
+            params={'fields': ','.join(EXPORT_CARD_FIELDS)}
+    ):
+        yield from build_rows(fetch_cards(trello, cards, users_mapping,
+                                          board_index, journal))
+
+
+def get_state_path(csv_path: Union[str, os.PathLike]) -> pathlib.Path:
+    return pathlib.Path(csv_path).with_suffix('.state.json')
+
+
+def get_journal_path(csv_path: Union[str, os.PathLike]) -> pathlib.Path:
+    return pathlib.Path(csv_path).with_suffix('.journal.jsonl')
+
+
+def read_export_state(board_id: str,
+                      csv_path: Union[str, os.PathLike]) -> Dict[str, str]:
+    try:
+        with open(get_state_path(csv_path), 'r') as file:
+            state = json.load(file)
+    except FileNotFoundError:
+        return {}
+    # Start over if the previous export was of another board
+    return state if state.get('board_id') == board_id else {}
+
+
+def write_export_state(board_id: str,
+                       csv_path: Union[str, os.PathLike],
+                       last_action: Dict[str, Any]) -> None:
+    with open(get_state_path(csv_path), 'w') as file:
+        json.dump({'board_id': board_id,
+                   'last_action_id': last_action.get('id'),
+                   'last_action_date': last_action.get('date')}, file)
+
+
+def merge_changed_cards(
+        trello: Trello,
+        board_id: str,
+        csv_path: Union[str, os.PathLike],
+        users_mapping: Dict[str, str],
+        changed_card_ids: Set[str],
+        journal: Journal = None
+) -> Tuple[List[Dict[str, str]], List[Dict[str, str]]]:
+    """
+    Re-fetches only the given cards and merges them into the previously
+    exported board.
+
+    :param trello: Trello adapter
+    :param board_id: ID of the board
+    :param csv_path: Path to the previously exported board
+    :param users_mapping: Mapping of Trello to YouTrack usernames
+    :param changed_card_ids: IDs of the changed cards
+    :param journal: Journal of the retrieved resources to resume from
+    :return: The merged board rows, and the rows of the changed cards
+    :raises RuntimeError: If any of the changed cards still on the board
+        failed to fetch
+    """
+    # The current cards also tell the deleted, archived and moved ones apart
+    cards = trello.get_board_cards(board_id, card_fields=CARD_INDEX_FIELDS)
+    board_index = get_board_index(trello, board_id)
+    changed_cards = [card for card in cards if card['id'] in changed_card_ids]
+    changed_cards = fetch_cards(
+        trello,
+        list(trello.get_cards_bulk(changed_cards,
+                                   card_fields=EXPORT_CARD_FIELDS,
+                                   journal=journal).values()),
+        users_mapping,
+        board_index,
+        journal
+    )
+    # A changed card that failed to fetch would lose its rows, and the next
+    # incremental export would not see its change again
+    fetched_links = {card.short_link for card in changed_cards}
+    missing_links = [card['shortLink'] for card in cards
+                     if card['id'] in changed_card_ids
+                     and card['shortLink'] not in fetched_links]
+    if missing_links:
+        raise RuntimeError(f'Failed to fetch the changed Cards '
+                           f'{", ".join(missing_links)}')
+
+    changed_card_numbers = {card.id_short for card in changed_cards}
+    kept_cards = {str(card['idShort']): card for card in cards
+                  if str(card['idShort']) not in changed_card_numbers}
+    board = []
+    for row in trello.read_board(csv_path):
+        card = kept_cards.get(row['ID'].split('-')[0])
+        if card is None:
+            continue
+        # The list changes (e.g. renames) are board actions rather than card
+        # ones, so the Sprint of the kept rows is resolved again
+        row['Sprint (version)'] = trello.parse_card_list(
+            board_index.get_card_list(card)
+        )
+        board.append(row)
+    changed_rows = list(build_board(changed_cards))
+    return trello.sort_board([*board, *changed_rows]), changed_rows
+
+
+def export_changed_cards(trello: Trello,
+                         board_id: str,
+                         csv_path: Union[str, os.PathLike],
+                         users_mapping: Dict[str, str],
+                         since: str,
+                         journal: Journal = None) -> List[Dict[str, str]]:
+    """
+    Re-fetches only the cards changed since the given action and merges them
+    into the previously exported board.
+
+    :param trello: Trello adapter
+    :param board_id: ID of the board
+    :param csv_path: Path to the previously exported board
+    :param users_mapping: Mapping of Trello to YouTrack usernames
+    :param since: ID of the last action of the previous export
+    :param journal: Journal of the retrieved resources to resume from
+    :return: The merged board rows
+    """
+    actions = trello.get_board_actions(board_id, since=since)
+    changed_card_ids = {action['data']['card']['id'] for action in actions
+                        if 'card' in action.get('data', {})}
+    print(f'Changed Cards: {len(changed_card_ids)}')
+    board, _ = merge_changed_cards(trello, board_id, csv_path, users_mapping,
+                                   changed_card_ids, journal)
+    return board
+
+
+def create_trello(cache_ttl: float = None, metrics: Metrics = None) -> Trello:
+    cache = ResponseCache(CACHE_DIR, ttl=cache_ttl) if cache_ttl else None
+    return Trello(api_key=TRELLO_API_KEY, api_token=TRELLO_API_TOKEN,
+                  max_workers=TRELLO_MAX_WORKERS,
+                  batch_size=TRELLO_BATCH_SIZE,
+                  cache=cache,
+                  metrics=metrics)
+
+
+def measure_stage(metrics: Metrics, name: str) -> ContextManager:
+    return metrics.stage(name) if metrics else nullcontext()
+
+
+def write_metrics(metrics: Metrics,
+                  json_path: Union[str, os.PathLike] = None,
+                  prometheus_path: Union[str, os.PathLike] = None) -> None:
+    if json_path:
+        metrics.write_json(json_path)
+        print(f'Wrote metrics to {json_path}')
+    if prometheus_path:
+        metrics.write_prometheus(prometheus_path)
+        print(f'Wrote metrics to {prometheus_path}')
+
+
+def export_trello(snapshot: bool = False,
+                  cache_ttl: float = None,
+                  incremental: bool = False,
+                  stream: bool = False,
+                  board_id: str = None,
+                  csv_path: Union[str, os.PathLike] = EXPORT_CSV_PATH,
+                  trello: Trello = None,
+                  users_mapping: Dict[str, str] = None,
+                  metrics: Metrics = None,
+                  output_format: str = 'csv',
+                  compression: str = None,
+                  resume: bool = False):
+    """
+    Exports the Trello board to a CSV (or JSON Lines, Parquet) file.
+
+    :param snapshot: Whether to retrieve the board with a few board-level
+        requests instead of requests per card
+    :param cache_ttl: Time in seconds to reuse the cached Trello responses
+        of the previous runs for (cache disabled if not given)
+    :param incremental: Whether to re-fetch only the cards changed since the
+        previous incremental export and merge them into its CSV
+    :param stream: Whether to stream the cards from fetch to the CSV with
+        bounded memory instead of holding the whole board in memory
+    :param board_id: ID of the board (defaults to `TRELLO_BOARD_ID`)
+    :param csv_path: Path to the output file (its suffix replaced by those of
+        the format and the compression)
+    :param trello: Trello adapter to share between boards (created if not
+        given)
+    :param users_mapping: Mapping of Trello to YouTrack usernames to share
+        between boards (read from `USERS_CSV_PATH` if not given)
+    :param metrics: Recorder of the request metrics and the stage durations
+        (disabled if not given)
+    :param output_format: Format of the output, `csv`, `jsonl` or `parquet`
+    :param compression: Compression of the output, `gzip` or `zstd`
+        (uncompressed if not given)
+    :param resume: Whether to resume the failed previous export, skipping the
+        card resources it retrieved
+    """
+    board_id = board_id or TRELLO_BOARD_ID
+    csv_path = get_output_path(csv_path, output_format, compression)
+    trello = trello or create_trello(cache_ttl, metrics)
+    if users_mapping is None:
+        users_mapping = trello.read_users_mapping(USERS_CSV_PATH)
+
+    # Records the retrieved resources for resuming if the export fails
+    with Journal(get_journal_path(csv_path), resume=resume) as journal:
+        with measure_stage(metrics, 'fetch'):
+            if incremental:
+                # Take the high-water mark first to catch the changes meanwhile
+                last_action = trello.get_board_latest_action(board_id)
+                state = read_export_state(board_id, csv_path)
+            if (incremental and state.get('last_action_id')
+                    and os.path.exists(csv_path)):
+                board = export_changed_cards(trello, board_id, csv_path,
+                                             users_mapping,
+                                             since=state['last_action_id'],
+                                             journal=journal)
+            elif stream:
+                # Fetched and sorted lazily while written
+                board = trello.sort_board_external(
+                    stream_board(trello, board_id, users_mapping, journal)
+                )
+            else:
+                if snapshot:
+                    cards = trello.parse_cards(
+                        *trello.get_board_snapshot(
+                            board_id,
+                            card_fields=EXPORT_CARD_FIELDS,
+                            list_fields=EXPORT_LIST_FIELDS,
+                            member_fields=EXPORT_MEMBER_FIELDS,
+                            action_fields=EXPORT_ACTION_FIELDS
+                        ),
+                        users_mapping
+                    )
+                else:
+                    cards = fetch_cards(
+                        trello,
+                        trello.get_board_cards(board_id,
+                                               card_fields=EXPORT_CARD_FIELDS),
+                        users_mapping,
+                        get_board_index(trello, board_id),
+                        journal
+                    )
+                # Only the compact cards are held, the rows are built while
+                # written
+                board = build_board(trello.sort_cards(cards))
+        with measure_stage(metrics, 'stream' if stream else 'write'):
+            trello.export_board(board, csv_path, CSV_HEADER,
+                                output_format=output_format,
+                                compression=compression)
+        journal.remove()
+    if incremental:
+        write_export_state(board_id, csv_path, last_action)
+
+
+def export_attachments(
+        board_id: str = None,
+        directory: Union[str, os.PathLike] = ATTACHMENTS_DIR,
+        csv_path: Union[str, os.PathLike] = ATTACHMENTS_CSV_PATH,
+        trello: Trello = None,
+        metrics: Metrics = None
+):
+    """
+    Downloads the files uploaded to the Trello board cards, and writes the
+    manifest mapping them to their cards.
+    The downloads are journaled in the directory, so the next runs download
+    only the new attachments (or the failed ones).
+
+    :param board_id: ID of the board (defaults to `TRELLO_BOARD_ID`)
+    :param directory: Directory to store the files in
+    :param csv_path: Path to the manifest CSV
+    :param trello: Trello adapter (created if not given)
+    :param metrics: Recorder of the request metrics and the stage durations
+        (disabled if not given)
+    """
+    board_id = board_id or TRELLO_BOARD_ID
+    trello = trello or create_trello(metrics=metrics)
+    with measure_stage(metrics, 'fetch attachments'):
+        attachments = trello.parse_attachments(
+            trello.get_board_attachments(board_id)
+        )
+    os.makedirs(directory, exist_ok=True)
+    with Journal(pathlib.Path(directory) / 'attachments.journal.jsonl',
+                 resume=True) as journal, \
+            measure_stage(metrics, 'download attachments'):
+        downloads = trello.download_attachments_bulk(attachments, directory,
+                                                     journal)
+    rows = [{'ID': attachment.id,
+             'Card': attachment.card_number,
+             'Name': attachment.name,
+             'SHA-256': downloads[attachment.id]['sha256'],
+             'Path': downloads[attachment.id]['path']}
+            for attachment in attachments if attachment.id in downloads]
+    trello.export_board(rows, csv_path, ATTACHMENTS_CSV_HEADER)
+
+
+def iter_merged_boards(
+        board_csv_paths: Dict[str, Union[str, os.PathLike]]
+) -> Iterator[Dict[str, str]]:
+    """
+    Yields the rows of the given exported boards with board-prefixed IDs.
+
+    :param board_csv_paths: Mapping of board IDs to their exported paths
+    :return: Iterator of the rows
+    """
+    for board_id, csv_path in board_csv_paths.items():
+        for row in read_board(csv_path):
+            row['ID'] = f'{board_id}-{row["ID"]}'
+            yield row
+
+
+def export_trello_boards(board_ids: List[str] = None,
+                         organization_id: str = None,
+                         merge: bool = False,
+                         cache_ttl: float = None,
+                         metrics: Metrics = None,
+                         output_format: str = 'csv',
+                         compression: str = None,
+                         **kwargs):
+    """
+    Exports several Trello boards in parallel through a single Trello adapter
+    and users mapping, each to its own CSV file.
+
+    :param board_ids: IDs of the boards
+    :param organization_id: ID of the organization (Workspace) to export all
+        the open boards of, instead of the given boards
+    :param merge: Whether to also merge the boards into a single CSV file
+        with board-prefixed IDs
+    :param cache_ttl: Time in seconds to reuse the cached Trello responses
+        of the previous runs for (cache disabled if not given)
+    :param metrics: Recorder of the request metrics and the stage durations
+        (disabled if not given)
+    :param output_format: Format of the outputs, `csv`, `jsonl` or `parquet`
+    :param compression: Compression of the outputs, `gzip` or `zstd`
+        (uncompressed if not given)
+    :param kwargs: Keyword arguments of `export_trello`
+    """
+    trello = create_trello(cache_ttl, metrics)
+    users_mapping = trello.read_users_mapping(USERS_CSV_PATH)
+    if organization_id:
+        board_ids = [board['id'] for board in
+                     trello.get_organization_boards(organization_id)]
+    board_csv_paths = {
+        board_id: get_output_path(BOARD_CSV_PATH.format(board_id=board_id),
+                                  output_format, compression)
+        for board_id in board_ids
+    }
+    print(f'Exporting {len(board_ids)} boards\n')
+
+    def export_board(board_id: str) -> None:
+        export_trello(board_id=board_id,
+                      csv_path=board_csv_paths[board_id],
+                      trello=trello,
+                      users_mapping=users_mapping,
+                      metrics=metrics,
+                      output_format=output_format,
+                      compression=compression,
+                      **kwargs)
+
+    with ThreadPoolExecutor(max_workers=TRELLO_BOARD_WORKERS) as executor:
+        # Consume the results to raise the failures
+        list(executor.map(export_board, board_ids))
+    if merge:
+        with measure_stage(metrics, 'merge'):
+            trello.export_board(iter_merged_boards(board_csv_paths),
+                                get_output_path(EXPORT_CSV_PATH,
+                                                output_format, compression),
+                                CSV_HEADER,
+                                output_format=output_format,
+                                compression=compression)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Export a Trello board.')
+    parser.add_argument('--snapshot', action='store_true',
+                        help='retrieve the board with a few board-level '
+                             'requests instead of requests per card')
+    parser.add_argument('--cache-ttl', type=float, default=None,
+                        help='reuse the cached Trello responses of the '
+                             'previous runs for this many seconds')
+    parser.add_argument('--incremental', action='store_true',
+                        help='re-fetch only the cards changed since the '
+                             'previous incremental export')
+    parser.add_argument('--stream', action='store_true',
+                        help='stream the cards to the CSV with bounded '
+                             'memory (for very large boards)')
+    parser.add_argument('--resume', action='store_true',
+                        help='resume the failed previous export, skipping '
+                             'the card resources it retrieved')
+    parser.add_argument('--boards', nargs='+', metavar='BOARD_ID',
+                        help='export these boards in parallel, each to '
+                             'its own CSV')
+    parser.add_argument('--organization', metavar='ORGANIZATION_ID',
+                        help='export all the open boards of this '
+                             'organization (Workspace) in parallel')
+    parser.add_argument('--merge', action='store_true',
+                        help='also merge the exported boards into a single '
+                             'CSV with board-prefixed IDs')
+    parser.add_argument('--format', choices=OUTPUT_FORMATS, default='csv',
+                        dest='output_format',
+                        help='format of the output (parquet requires '
+                             'pyarrow)')
+    parser.add_argument('--compression', choices=list(COMPRESSIONS),
+                        help='compress the CSV or JSON Lines output (zstd '
+                             'requires zstandard)')
+    parser.add_argument('--attachments', action='store_true',
+                        help='also download the files attached to the '
+                             'cards of the board to assets/attachments')
+    parser.add_argument('--metrics-json', metavar='PATH',
+                        help='write the request metrics and the stage '
+                             'durations to this JSON file')
+    parser.add_argument('--metrics-prometheus', metavar='PATH',
+                        help='write the request metrics and the stage '
+                             'durations to this Prometheus textfile')
+    args = parser.parse_args()
+    # The attachments manifest, as read by the importer, is of a single board
+    if args.attachments and (args.boards or args.organization):
+        parser.error('--attachments cannot be combined with --boards or '
+                     '--organization')
+    return args
 
 
 if __name__ == '__main__':
-    with Logger(__file__) as logger:
-        export_trello()
+    args = parse_args()
+    metrics = (Metrics() if args.metrics_json or args.metrics_prometheus
+               else None)
+    with Logger(__file__, queued=True,
+                max_record_size=LOG_RECORD_SIZE) as logger:
+        try:
+            if args.boards or args.organization:
+                export_trello_boards(board_ids=args.boards,
+                                     organization_id=args.organization,
+                                     merge=args.merge,
+                                     cache_ttl=args.cache_ttl,
+                                     metrics=metrics,
+                                     snapshot=args.snapshot,
+                                     incremental=args.incremental,
+                                     stream=args.stream,
+                                     output_format=args.output_format,
+                                     compression=args.compression,
+                                     resume=args.resume)
+            else:
+                export_trello(snapshot=args.snapshot,
+                              cache_ttl=args.cache_ttl,
+                              incremental=args.incremental,
+                              stream=args.stream,
+                              metrics=metrics,
+                              output_format=args.output_format,
+                              compression=args.compression,
+                              resume=args.resume)
+                if args.attachments:
+                    export_attachments(metrics=metrics)
+        finally:
+            # Also report the metrics of the failed runs
+            if metrics:
+                write_metrics(metrics, args.metrics_json,
+                              args.metrics_prometheus)
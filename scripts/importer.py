@@ -1,19 +1,509 @@
+import argparse
+import datetime
+import logging
 import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Iterable, Tuple, Optional, Union
 
+from scripts.exporter import (TRELLO_BOARD_ID, CACHE_DIR, EXPORT_CSV_PATH,
+                              USERS_CSV_PATH, ATTACHMENTS_CSV_PATH,
+                              LOG_RECORD_SIZE, create_trello, measure_stage,
+                              write_metrics)
 from src.trcsvyt.logger import Logger
-from src.trcsvyt.youtrack import YouTrack
+from src.trcsvyt.metadata import ProjectMetadata
+from src.trcsvyt.metrics import Metrics
+from src.trcsvyt.models import Comment
+from src.trcsvyt.trello import Trello
+from src.trcsvyt.youtrack import YouTrack, ISSUE_ATTRIBUTES
 
 YOUTRACK_API_BASE_URL = os.getenv('YOUTRACK_API_BASE_URL')
 YOUTRACK_PERM_TOKEN = os.getenv('YOUTRACK_PERM_TOKEN')
+YOUTRACK_PROJECT = os.getenv('YOUTRACK_PROJECT')
+YOUTRACK_MAX_WORKERS = int(os.getenv('YOUTRACK_MAX_WORKERS', 8))
+# Concurrent uploads, each holding its file in memory
+YOUTRACK_UPLOAD_WORKERS = int(os.getenv('YOUTRACK_UPLOAD_WORKERS', 4))
 
+# On-disk copy of the project metadata
+METADATA_PATH = f'{CACHE_DIR}/youtrack-{{project}}.json'
 
-def import_youtrack():
+# Mapping of the exported CSV columns to the synced YouTrack fields
+# (the Author and Created are set only by the CSV import)
+FIELDS_MAPPING = {
+    'Summary': 'Summary',
+    'Description': 'Description',
+    'State (state)': 'State',
+    'Sprint (version)': 'Sprint',
+    'Story Points (integer)': 'Story points',
+    'Assignee (user)': 'Assignee',
+    'Due Date (date)': 'Due Date',
+}
+
+SYNC_ISSUE_FIELDS = \
+    'id,idReadable,summary,description,created,' \
+    'customFields(name,value(login,name,presentation))'
+
+# Along with the comments to tell the already migrated ones
+COMMENT_ISSUE_FIELDS = f'{SYNC_ISSUE_FIELDS},comments(text)'
+
+# Along with the attachments to tell the already uploaded ones
+ATTACHMENT_ISSUE_FIELDS = f'{SYNC_ISSUE_FIELDS},attachments(name)'
+
+# Footer of the synced Issue descriptions naming their row, matching them on
+# the next runs even once their summary or assignee changed
+ISSUE_FOOTER = '*Trello card {id}*'
+ISSUE_FOOTER_PATTERN = re.compile(r'\s*\*Trello card ([\w-]+)\*\s*$')
+
+# Footer of the migrated comments, telling them apart on the next runs
+COMMENT_FOOTER = '*Trello comment {id} by {author} on {created}*'
+COMMENT_FOOTER_PATTERN = re.compile(r'\*Trello comment (\w+) by ')
+
+
+def parse_field_value(field_name: str, value: Any) -> str:
+    """
+    Returns the given single value of an Issue field in the format of the CSV.
+    """
+    if isinstance(value, dict):
+        value = (value.get('login') or value.get('name')
+                 or value.get('presentation'))
+    if value is None:
+        return ''
+    if field_name == 'Due Date':
+        # Dates are Unix timestamps in milliseconds
+        return datetime.datetime.fromtimestamp(
+            value / 1000, tz=datetime.timezone.utc
+        ).date().isoformat()
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def parse_issue_field(issue: Dict[str, Any], field_name: str) -> str:
+    """
+    Returns the value of the given Issue field in the format of the CSV.
+    """
+    if field_name == 'Summary':
+        return issue.get('summary') or ''
+    if field_name == 'Description':
+        return ISSUE_FOOTER_PATTERN.sub('', issue.get('description') or '')
+    for custom_field in issue.get('customFields', []):
+        if custom_field['name'] != field_name:
+            continue
+        value = custom_field['value']
+        # Multi-value fields (e.g. Assignee) are compared by the whole set of
+        # values, so that any value besides the row one differs too
+        if isinstance(value, list):
+            return ', '.join(sorted(parse_field_value(field_name, item)
+                                    for item in value))
+        return parse_field_value(field_name, value)
+    return ''
+
+
+def parse_row_field(row: Dict[str, str], column: str) -> str:
+    value = row.get(column) or ''
+    if column == 'Due Date (date)' and value:
+        # Trello dates are ISO 8601 date-times, e.g. 2024-01-31T12:00:00.000Z
+        return value[:len('YYYY-MM-DD')]
+    return value
+
+
+def parse_issue_row_id(issue: Dict[str, Any]) -> Optional[str]:
+    """
+    Returns the ID of the row the given Issue was synced from, if any.
+    """
+    match = ISSUE_FOOTER_PATTERN.search(issue.get('description') or '')
+    return match.group(1) if match else None
+
+
+def format_description(row: Dict[str, str]) -> str:
+    footer = ISSUE_FOOTER.format(id=row['ID'])
+    description = row.get('Description') or ''
+    return f'{description}\n\n{footer}' if description else footer
+
+
+def issue_key(summary: str, assignee: str) -> Tuple[str, str]:
+    # The exported rows are duplicated per assignee with the same summary
+    return summary.strip(), assignee
+
+
+def index_issues(
+        issues: Iterable[Dict[str, Any]]
+) -> Dict[Union[str, Tuple[str, str]], List[Dict[str, Any]]]:
+    """
+    Indexes the given Issues by the ID of the row they were synced from, or
+    by their summary and assignee if they predate the footer, oldest first.
+    """
+    index = {}
+    for issue in sorted(issues, key=lambda issue: issue.get('created') or 0):
+        key = (parse_issue_row_id(issue)
+               or issue_key(parse_issue_field(issue, 'Summary'),
+                            parse_issue_field(issue, 'Assignee')))
+        index.setdefault(key, []).append(issue)
+    return index
+
+
+def match_issues(
+        rows: List[Dict[str, str]],
+        index: Dict[Union[str, Tuple[str, str]], List[Dict[str, Any]]]
+) -> List[Tuple[Dict[str, str], Optional[Dict[str, Any]]]]:
+    """
+    Matches the given rows to the indexed Issues, each Issue to a single row:
+    by the row ID, so that the renamed or reassigned cards keep their
+    Issues, or else by the summary and assignee.
+
+    :return: List of the rows and their Issues (`None` if missing)
+    """
+    matches = []
+    for row in rows:
+        issues = (index.get(row['ID'])
+                  or index.get(issue_key(row['Summary'],
+                                         row['Assignee (user)'])))
+        matches.append((row, issues.pop(0) if issues else None))
+    return matches
+
+
+def diff_issue(issue: Dict[str, Any], row: Dict[str, str]) -> Dict[str, str]:
+    """
+    Returns the fields of the given Issue that differ from the given row.
+    The empty row values are skipped, as they cannot be cleared by commands.
+    The description is pushed along with the footer naming the row.
+    """
+    changes = {}
+    for column, field_name in FIELDS_MAPPING.items():
+        value = parse_row_field(row, column)
+        if value and value != parse_issue_field(issue, field_name):
+            changes[field_name] = value
+    # The Issues synced before the footer (matched by their summary) get it
+    if 'Description' in changes or parse_issue_row_id(issue) != row['ID']:
+        changes['Description'] = format_description(row)
+    return changes
+
+
+def split_custom_fields(
+        changes: Dict[str, str],
+        metadata: ProjectMetadata
+) -> Tuple[List[Dict[str, Any]], Dict[str, str]]:
+    """
+    Resolves the given custom field changes with the project metadata.
+
+    :return: The resolved custom fields in the format of the Issue, and the
+        changes left to the commands (the Issue attributes and the values
+        missing from the metadata)
+    """
+    custom_fields = []
+    rest = {}
+    for field_name, value in changes.items():
+        if field_name.lower() in ISSUE_ATTRIBUTES:
+            rest[field_name] = value
+            continue
+        try:
+            custom_fields.append(metadata.build_custom_field(field_name,
+                                                             value))
+        except ValueError:
+            rest[field_name] = value
+    return custom_fields, rest
+
+
+def validate_changes(changes: Dict[str, Dict[str, str]],
+                     metadata: ProjectMetadata) -> None:
+    """
+    Drops the custom field values that cannot be resolved in the project, as
+    their commands would fail anyway.
+    """
+    for issue_id, issue_changes in changes.items():
+        for field_name, value in list(issue_changes.items()):
+            if field_name.lower() in ISSUE_ATTRIBUTES:
+                continue
+            try:
+                metadata.build_custom_field(field_name, value)
+            except ValueError as error:
+                logging.error(f'Skipped {field_name} of Issue {issue_id}: '
+                              f'{error}')
+                del issue_changes[field_name]
+
+
+def replace_multi_value_fields(changes: Dict[str, Dict[str, Any]],
+                               metadata: ProjectMetadata) -> None:
+    """
+    Moves the changes of the multi-value fields (e.g. Assignee) to the
+    `customFields` updated at once, which replaces their previous values,
+    whereas a command would only add the new value to them.
+    """
+    for issue_changes in changes.values():
+        custom_fields = []
+        for field_name in list(issue_changes):
+            field = metadata.fields.get(field_name)
+            if field and field['type'].endswith('[*]'):
+                custom_fields.append(metadata.build_custom_field(
+                    field_name, issue_changes.pop(field_name)
+                ))
+        if custom_fields:
+            issue_changes['customFields'] = custom_fields
+
+
+def create_issues(youtrack: YouTrack,
+                  project_id: str,
+                  rows: List[Dict[str, str]],
+                  metadata: ProjectMetadata) -> Dict[str, Dict[str, str]]:
+    """
+    Creates an Issue per given row, with its custom fields resolved by the
+    project metadata set at once, and returns the changes of their fields
+    left to the commands.
+    The failed rows are reported, so that the rest are still created.
+    """
+    def try_create_issue(
+            row: Dict[str, str]
+    ) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        try:
+            custom_fields, _ = split_custom_fields(diff_issue({}, row),
+                                                   metadata)
+            return youtrack.create_issue(project_id,
+                                         summary=row['Summary'],
+                                         description=format_description(row),
+                                         fields=SYNC_ISSUE_FIELDS,
+                                         custom_fields=custom_fields), None
+        except Exception as error:
+            return None, str(error)
+
+    changes = {}
+    failed_count = 0
+    with ThreadPoolExecutor(max_workers=YOUTRACK_MAX_WORKERS) as executor:
+        for row, (issue, error) in zip(rows,
+                                       executor.map(try_create_issue, rows)):
+            if error:
+                logging.error(f'Failed to create the Issue of {row["ID"]}: '
+                              f'{error}')
+                failed_count += 1
+                continue
+            issue_changes = diff_issue(issue, row)
+            if issue_changes:
+                changes[issue['idReadable']] = issue_changes
+            print(f'Created Issue {issue["idReadable"]} for {row["ID"]}')
+    print(f'Created {len(rows) - failed_count} Issues, '
+          f'failed {failed_count}\n')
+    validate_changes(changes, metadata)
+    return changes
+
+
+def import_youtrack(dry_run: bool = False,
+                    metrics: Metrics = None,
+                    metadata_ttl: float = None,
+                    rows: List[Dict[str, str]] = None,
+                    youtrack: YouTrack = None):
+    """
+    Syncs the exported Trello board CSV to the YouTrack project by pushing
+    only the changed fields of the changed Issues, and creating the missing
+    ones.
+
+    :param dry_run: Whether to only report the changes without pushing them
+    :param metrics: Recorder of the request metrics and the stage durations
+        (disabled if not given)
+    :param metadata_ttl: Time in seconds to reuse the on-disk copy of the
+        project metadata of the previous runs for (disabled if not given)
+    :param rows: Rows to sync (all the exported ones if not given)
+    :param youtrack: YouTrack adapter to reuse, along with the project
+        metadata it retrieved (created if not given)
+    """
+    youtrack = youtrack or YouTrack(api_base_url=YOUTRACK_API_BASE_URL,
+                                    perm_token=YOUTRACK_PERM_TOKEN,
+                                    metrics=metrics)
+    if rows is None:
+        rows = Trello.read_board_csv(EXPORT_CSV_PATH)
+    with measure_stage(metrics, 'fetch'):
+        project = youtrack.get_project(YOUTRACK_PROJECT)
+        if metadata_ttl:
+            metadata = youtrack.get_project_metadata(
+                project['id'],
+                cache_path=METADATA_PATH.format(project=YOUTRACK_PROJECT),
+                ttl=metadata_ttl
+            )
+        else:
+            metadata = youtrack.get_project_metadata(project['id'])
+        index = index_issues(youtrack.iter_issues(
+            fields=SYNC_ISSUE_FIELDS, query=f'project: {YOUTRACK_PROJECT}'
+        ))
+
+    changes = {}
+    missing_rows = []
+    for row, issue in match_issues(rows, index):
+        if not issue:
+            missing_rows.append(row)
+            continue
+        issue_changes = diff_issue(issue, row)
+        if issue_changes:
+            changes[issue['idReadable']] = issue_changes
+    validate_changes(changes, metadata)
+    changes = {issue_id: issue_changes
+               for issue_id, issue_changes in changes.items()
+               if issue_changes}
+    print(f'Changed Issues: {len(changes)}, '
+          f'missing Issues: {len(missing_rows)} of {len(rows)} rows')
+    if dry_run:
+        for issue_id, issue_changes in changes.items():
+            print(f'{issue_id}: {issue_changes}')
+        return
+
+    with measure_stage(metrics, 'push'):
+        if missing_rows:
+            changes.update(create_issues(youtrack, project['id'],
+                                         missing_rows, metadata))
+        replace_multi_value_fields(changes, metadata)
+        youtrack.update_issues_bulk(changes, max_workers=YOUTRACK_MAX_WORKERS)
+
+
+def format_comment(comment: Comment) -> str:
+    footer = COMMENT_FOOTER.format(id=comment.id,
+                                   author=comment.author or 'unknown',
+                                   created=comment.created)
+    return f'{comment.text}\n\n{footer}'
+
+
+def migrate_comments(dry_run: bool = False, metrics: Metrics = None):
+    """
+    Migrates the comments of the exported Trello board cards to the synced
+    YouTrack Issues of the cards, skipping the already migrated ones.
+    The comments of a card are added to all of its Issues, as the card is
+    exported once per assignee.
+
+    :param dry_run: Whether to only report the comments without adding them
+    :param metrics: Recorder of the request metrics and the stage durations
+        (disabled if not given)
+    """
+    trello = create_trello(metrics=metrics)
     youtrack = YouTrack(api_base_url=YOUTRACK_API_BASE_URL,
-                        perm_token=YOUTRACK_PERM_TOKEN)
+                        perm_token=YOUTRACK_PERM_TOKEN,
+                        metrics=metrics)
+    users_mapping = trello.read_users_mapping(USERS_CSV_PATH)
+    rows = Trello.read_board_csv(EXPORT_CSV_PATH)
+    with measure_stage(metrics, 'fetch comments'):
+        index = index_issues(youtrack.iter_issues(
+            fields=COMMENT_ISSUE_FIELDS, query=f'project: {YOUTRACK_PROJECT}'
+        ))
+        # Oldest first, to add them in order
+        actions = trello.get_board_comments(TRELLO_BOARD_ID)[::-1]
+
+    card_issues = {}
+    migrated = set()
+    for row, issue in match_issues(rows, index):
+        if not issue:
+            continue
+        card_issues.setdefault(row['ID'].split('-')[0], []).append(issue)
+        for issue_comment in issue.get('comments', []):
+            match = COMMENT_FOOTER_PATTERN.search(issue_comment.get('text')
+                                                  or '')
+            if match:
+                migrated.add((issue['idReadable'], match.group(1)))
+
+    comments = []
+    for action in actions:
+        comment = trello.parse_comment(action, users_mapping)
+        if not comment:
+            continue
+        for issue in card_issues.get(comment.card_number, []):
+            if (issue['idReadable'], comment.id) not in migrated:
+                comments.append((issue['idReadable'],
+                                 format_comment(comment)))
+    print(f'Comments: {len(actions)}, '
+          f'pending Issue comments: {len(comments)}')
+    if dry_run:
+        for issue_id, text in comments:
+            print(f'{issue_id}: {text}')
+        return
+
+    with measure_stage(metrics, 'push comments'):
+        youtrack.add_comments_bulk(comments,
+                                   max_workers=YOUTRACK_MAX_WORKERS)
+
+
+def migrate_attachments(dry_run: bool = False, metrics: Metrics = None):
+    """
+    Uploads the downloaded attachments of the exported Trello board cards to
+    the synced YouTrack Issues of the cards, skipping the Issues that already
+    have an attachment of the same name.
+    The attachments of a card are uploaded to all of its Issues, as the card
+    is exported once per assignee.
+
+    :param dry_run: Whether to only report the attachments without uploading
+        them
+    :param metrics: Recorder of the request metrics and the stage durations
+        (disabled if not given)
+    """
+    youtrack = YouTrack(api_base_url=YOUTRACK_API_BASE_URL,
+                        perm_token=YOUTRACK_PERM_TOKEN,
+                        metrics=metrics)
+    rows = Trello.read_board_csv(EXPORT_CSV_PATH)
+    with measure_stage(metrics, 'fetch attachments'):
+        index = index_issues(youtrack.iter_issues(
+            fields=ATTACHMENT_ISSUE_FIELDS,
+            query=f'project: {YOUTRACK_PROJECT}'
+        ))
+
+    card_issues = {}
+    for row, issue in match_issues(rows, index):
+        if issue:
+            card_issues.setdefault(row['ID'].split('-')[0], []).append(issue)
+
+    manifest = Trello.read_board_csv(ATTACHMENTS_CSV_PATH)
+    attachments = []
+    for attachment in manifest:
+        for issue in card_issues.get(attachment['Card'], []):
+            uploaded = {issue_attachment.get('name') for issue_attachment
+                        in issue.get('attachments', [])}
+            if attachment['Name'] not in uploaded:
+                attachments.append((issue['idReadable'], attachment['Path'],
+                                    attachment['Name']))
+    print(f'Attachments: {len(manifest)}, '
+          f'pending Issue attachments: {len(attachments)}')
+    if dry_run:
+        for issue_id, path, name in attachments:
+            print(f'{issue_id}: {name} ({path})')
+        return
+
+    with measure_stage(metrics, 'push attachments'):
+        youtrack.upload_attachments_bulk(attachments,
+                                         max_workers=YOUTRACK_UPLOAD_WORKERS)
+
 
-    raise NotImplementedError('Implement your import into YouTrack script.')
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description='Sync the exported Trello board to YouTrack.'
+    )
+    parser.add_argument('--dry-run', action='store_true',
+                        help='only report the changes without pushing them')
+    parser.add_argument('--metadata-ttl', type=float, default=None,
+                        help='reuse the project custom fields, bundle '
+                             'values and users of the previous runs for '
+                             'this many seconds')
+    parser.add_argument('--comments', action='store_true',
+                        help='also migrate the Trello card comments to the '
+                             'Issues')
+    parser.add_argument('--attachments', action='store_true',
+                        help='also upload the downloaded Trello card '
+                             'attachments to the Issues')
+    parser.add_argument('--metrics-json', metavar='PATH',
+                        help='write the request metrics and the stage '
+                             'durations to this JSON file')
+    parser.add_argument('--metrics-prometheus', metavar='PATH',
+                        help='write the request metrics and the stage '
+                             'durations to this Prometheus textfile')
+    return parser.parse_args()
 
 
 if __name__ == '__main__':
-    with Logger(__file__) as logger:
-        import_youtrack()
+    args = parse_args()
+    metrics = (Metrics() if args.metrics_json or args.metrics_prometheus
+               else None)
+    with Logger(__file__, queued=True,
+                max_record_size=LOG_RECORD_SIZE) as logger:
+        try:
+            import_youtrack(dry_run=args.dry_run, metrics=metrics,
+                            metadata_ttl=args.metadata_ttl)
+            if args.comments:
+                migrate_comments(dry_run=args.dry_run, metrics=metrics)
+            if args.attachments:
+                migrate_attachments(dry_run=args.dry_run, metrics=metrics)
+        finally:
+            # Also report the metrics of the failed runs
+            if metrics:
+                write_metrics(metrics, args.metrics_json,
+                              args.metrics_prometheus)
@@ -0,0 +1,185 @@
+import argparse
+import os
+import threading
+from typing import Dict, Any, Optional, Set, Union
+
+from scripts.exporter import (TRELLO_BOARD_ID, EXPORT_CSV_PATH, USERS_CSV_PATH,
+                              CSV_HEADER, LOG_RECORD_SIZE, create_trello,
+                              export_trello, merge_changed_cards)
+from scripts.importer import (YOUTRACK_API_BASE_URL, YOUTRACK_PERM_TOKEN,
+                              import_youtrack)
+from src.trcsvyt.logger import Logger
+from src.trcsvyt.trello import Trello
+from src.trcsvyt.webhook import WebhookReceiver, Debouncer
+from src.trcsvyt.youtrack import YouTrack
+
+TRELLO_API_SECRET = os.getenv('TRELLO_API_SECRET')
+
+# Time in seconds without changes to wait for before applying them
+MIRROR_DEBOUNCE = 2.0
+
+
+def get_action_key(action: Dict[str, Any]) -> Optional[str]:
+    """
+    Returns the ID of the card changed by the given action, or of the list,
+    e.g. renamed, whose cards' Sprint every applied batch resolves again.
+    """
+    data = action.get('data', {})
+    return (data.get('card') or data.get('list') or {}).get('id')
+
+
+class Mirror:
+    def __init__(self,
+                 callback_url: str,
+                 host: str = '127.0.0.1',
+                 port: int = 8080,
+                 board_id: str = None,
+                 csv_path: Union[str, os.PathLike] = EXPORT_CSV_PATH,
+                 register: bool = True,
+                 sync_youtrack: bool = False,
+                 debounce: float = MIRROR_DEBOUNCE,
+                 secret: str = None,
+                 trello: Trello = None,
+                 users_mapping: Dict[str, str] = None):
+        """
+        Live mirror of a Trello board: a registered webhook calls the local
+        receiver back on every change, and the changed cards are re-fetched
+        and merged into the exported board (and optionally synced to
+        YouTrack) in debounced batches.
+
+        :param callback_url: Publicly reachable URL of the receiver
+        :param host: Host the receiver listens on
+        :param port: Port the receiver listens on
+        :param board_id: ID of the board (defaults to `TRELLO_BOARD_ID`)
+        :param csv_path: Path to the exported board (exported first if
+            missing)
+        :param register: Whether to register the webhook (and delete it on
+            close), or to rely on an existing one
+        :param sync_youtrack: Whether to also sync the changed cards to their
+            YouTrack Issues
+        :param debounce: Time in seconds without changes to wait for before
+            applying them
+        :param secret: Trello API secret the callbacks are signed with
+            (defaults to `TRELLO_API_SECRET`)
+        :param trello: Trello adapter (created if not given)
+        :param users_mapping: Mapping of Trello to YouTrack usernames (read
+            from `USERS_CSV_PATH` if not given)
+        """
+        self.callback_url = callback_url
+        self.board_id = board_id or TRELLO_BOARD_ID
+        self.csv_path = csv_path
+        self.register = register
+        self.debounce = debounce
+        self.secret = secret or TRELLO_API_SECRET
+        if not self.secret:
+            raise ValueError('The Trello API secret is required to verify '
+                             'the webhook callbacks.')
+        self.trello = trello or create_trello()
+        if users_mapping is None:
+            users_mapping = self.trello.read_users_mapping(USERS_CSV_PATH)
+        self.users_mapping = users_mapping
+        self.youtrack = (YouTrack(api_base_url=YOUTRACK_API_BASE_URL,
+                                  perm_token=YOUTRACK_PERM_TOKEN)
+                         if sync_youtrack else None)
+        self.applied_count = 0
+        self.webhook = None
+
+        self.receiver = WebhookReceiver(self.secret, callback_url,
+                                        self.on_action, host=host, port=port)
+        self.debouncer = None
+
+    def on_action(self, action: Dict[str, Any]) -> None:
+        # Only the card and list actions change the exported board
+        key = get_action_key(action)
+        if key:
+            self.debouncer.submit(key)
+
+    def apply(self, card_ids: Set[str]) -> None:
+        """
+        Re-fetches the given changed cards and merges them into the exported
+        board, and syncs their rows to YouTrack if enabled.
+        The changed lists match no card, as the merge resolves the Sprint of
+        all the rows again.
+        """
+        print(f'Applying the changes of {len(card_ids)} Cards and lists')
+        board, changed_rows = merge_changed_cards(self.trello, self.board_id,
+                                                  self.csv_path,
+                                                  self.users_mapping,
+                                                  card_ids)
+        self.trello.export_board(board, self.csv_path, CSV_HEADER)
+        if self.youtrack and changed_rows:
+            import_youtrack(rows=changed_rows, youtrack=self.youtrack)
+        self.applied_count += 1
+
+    def start(self) -> 'Mirror':
+        if not os.path.exists(self.csv_path):
+            export_trello(board_id=self.board_id, csv_path=self.csv_path,
+                          trello=self.trello,
+                          users_mapping=self.users_mapping)
+        self.debouncer = Debouncer(self.apply, delay=self.debounce)
+        self.receiver.start()
+        if self.register:
+            self.webhook = self.trello.create_webhook(
+                self.callback_url, self.board_id,
+                description=f'Mirror of board {self.board_id}'
+            )
+        print(f'Mirroring board {self.board_id} to {self.csv_path}, '
+              f'listening on port {self.receiver.port}')
+        return self
+
+    def close(self) -> None:
+        """
+        Deletes the registered webhook, stops receiving the callbacks and
+        applies the pending changes.
+        """
+        if self.webhook:
+            self.trello.delete_webhook(self.webhook['id'])
+            self.webhook = None
+        self.receiver.close()
+        self.debouncer.close()
+
+    def __enter__(self) -> 'Mirror':
+        return self.start()
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description='Mirror a Trello board live through a webhook.'
+    )
+    parser.add_argument('--callback-url', required=True,
+                        help='publicly reachable URL of the receiver')
+    parser.add_argument('--host', default='0.0.0.0',
+                        help='host the receiver listens on')
+    parser.add_argument('--port', type=int, default=8080,
+                        help='port the receiver listens on')
+    parser.add_argument('--debounce', type=float, default=MIRROR_DEBOUNCE,
+                        help='seconds without changes to wait for before '
+                             'applying them')
+    parser.add_argument('--no-register', action='store_false',
+                        dest='register',
+                        help='rely on an existing webhook instead of '
+                             'registering one')
+    parser.add_argument('--youtrack', action='store_true',
+                        help='also sync the changed cards to their YouTrack '
+                             'Issues')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    with Logger(__file__, queued=True,
+                max_record_size=LOG_RECORD_SIZE) as logger:
+        with Mirror(callback_url=args.callback_url,
+                    host=args.host,
+                    port=args.port,
+                    register=args.register,
+                    sync_youtrack=args.youtrack,
+                    debounce=args.debounce):
+            try:
+                # Serve until interrupted
+                threading.Event().wait()
+            except KeyboardInterrupt:
+                pass
@@ -0,0 +1,133 @@
+import hashlib
+import json
+import os
+import pathlib
+import threading
+import time
+from typing import Dict, Any, Optional, Union
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+# Ratio of the maximum size the eviction frees the cache down to, so that the
+# directory is scanned once per many writes rather than on every write
+EVICTION_RATIO = 0.9
+
+
+class ResponseCache:
+    def __init__(self,
+                 cache_dir: Union[str, os.PathLike],
+                 ttl: float = 3600,
+                 max_size: int = 512 * 1024 ** 2):
+        """
+        Persistent on-disk cache of HTTP responses.
+        Each entry is stored in its own file: a JSON line of metadata followed
+        by the raw response body.
+
+        :param cache_dir: Directory to store the cached responses in
+        :param ttl: Time in seconds a cached response is used without
+            revalidating it with the server
+        :param max_size: Maximum total size in bytes of the cached responses,
+            beyond which the least recently used ones are evicted
+        """
+        self.cache_dir = pathlib.Path(cache_dir)
+        self.ttl = ttl
+        self.max_size = max_size
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+        self.lock = threading.Lock()
+        self.size = sum(path.stat().st_size
+                        for path in self.cache_dir.glob('*.cache'))
+
+    @staticmethod
+    def key(request: requests.PreparedRequest) -> str:
+        # The URL includes the query parameters
+        return hashlib.sha256(
+            f'{request.method} {request.url}'.encode('utf-8')
+        ).hexdigest()
+
+    def path(self, key: str) -> pathlib.Path:
+        return self.cache_dir / f'{key}.cache'
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self.path(key), 'rb') as file:
+                entry = json.loads(file.readline())
+                entry['body'] = file.read()
+            # Record the access for the least recently used eviction, which
+            # may have removed the entry meanwhile
+            os.utime(self.path(key))
+        except (OSError, ValueError):
+            return None
+        return entry
+
+    def set(self, key: str, response: requests.Response) -> None:
+        entry = {'stored_at': time.time(),
+                 'status_code': response.status_code,
+                 'headers': dict(response.headers),
+                 'encoding': response.encoding}
+        self.write(key, entry, response.content)
+
+    def touch(self, key: str, entry: Dict[str, Any]) -> None:
+        """
+        Marks the given entry as fresh after it is revalidated by the server.
+        """
+        body = entry.pop('body')
+        entry['stored_at'] = time.time()
+        self.write(key, entry, body)
+        entry['body'] = body
+
+    def write(self, key: str, entry: Dict[str, Any], body: bytes) -> None:
+        path = self.path(key)
+        temp_path = path.with_suffix(f'.{threading.get_ident()}.tmp')
+        with open(temp_path, 'wb') as file:
+            file.write(json.dumps(entry).encode('utf-8') + b'\n')
+            file.write(body)
+        with self.lock:
+            if path.exists():
+                self.size -= path.stat().st_size
+            os.replace(temp_path, path)
+            self.size += path.stat().st_size
+            if self.size > self.max_size:
+                self.evict()
+
+    def evict(self) -> None:
+        """
+        Evicts the least recently used entries down to the low-water mark.
+        """
+        paths = sorted(self.cache_dir.glob('*.cache'),
+                       key=lambda path: path.stat().st_mtime)
+        for path in paths:
+            if self.size <= self.max_size * EVICTION_RATIO:
+                break
+            self.size -= path.stat().st_size
+            path.unlink()
+
+    def is_fresh(self, entry: Dict[str, Any]) -> bool:
+        return time.time() - entry['stored_at'] < self.ttl
+
+    @staticmethod
+    def validators(entry: Dict[str, Any]) -> Dict[str, str]:
+        """
+        Returns the headers to revalidate the given entry with the server.
+        """
+        headers = CaseInsensitiveDict(entry['headers'])
+        validators = {}
+        if 'ETag' in headers:
+            validators['If-None-Match'] = headers['ETag']
+        if 'Last-Modified' in headers:
+            validators['If-Modified-Since'] = headers['Last-Modified']
+        return validators
+
+    @staticmethod
+    def build_response(request: requests.PreparedRequest,
+                       entry: Dict[str, Any]) -> requests.Response:
+        response = requests.Response()
+        response.status_code = entry['status_code']
+        response.headers = CaseInsensitiveDict(entry['headers'])
+        response.encoding = entry['encoding']
+        response._content = entry['body']
+        response.url = request.url
+        response.request = request
+        response.reason = 'OK'
+        return response
@@ -0,0 +1,195 @@
+import csv
+import gzip
+import json
+import os
+import pathlib
+from itertools import islice
+from typing import (Tuple, List, Dict, Any, Iterable, Iterator, Optional,
+                    Union, IO)
+
+try:
+    import zstandard
+except ImportError:  # Optional, only for the zstd compressed outputs
+    zstandard = None
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # Optional, only for the Parquet outputs
+    pyarrow = None
+
+OUTPUT_FORMATS = ['csv', 'jsonl', 'parquet']
+
+# Mapping of the compressions to their file suffixes
+COMPRESSIONS = {
+    'gzip': '.gz',
+    'zstd': '.zst',
+}
+
+# Number of rows written at once
+WRITE_BATCH_SIZE = 1000
+
+
+def parse_output_format(
+        path: Union[str, os.PathLike]
+) -> Tuple[str, Optional[str]]:
+    """
+    Tells the format and the compression of an output from its path,
+    e.g. `trello-board.csv.gz`.
+
+    :param path: Path to the output
+    :return: The format and the compression (`None` if uncompressed)
+    """
+    suffixes = pathlib.Path(path).suffixes
+    compression = None
+    for name, suffix in COMPRESSIONS.items():
+        if suffixes and suffixes[-1] == suffix:
+            compression = name
+            suffixes = suffixes[:-1]
+    output_format = suffixes[-1][1:] if suffixes else ''
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f'Unsupported output format: {path}')
+    return output_format, compression
+
+
+def get_output_path(path: Union[str, os.PathLike],
+                    output_format: str = 'csv',
+                    compression: str = None) -> pathlib.Path:
+    """
+    Returns the given path with the suffixes of the given format and
+    compression, e.g. `trello-board.jsonl.zst` for `trello-board.csv`.
+    The Parquet files are compressed internally, so they keep their suffix.
+    """
+    path = pathlib.Path(path)
+    if path.suffix in COMPRESSIONS.values():
+        path = path.with_suffix('')
+    path = path.with_suffix(f'.{output_format}')
+    if compression and output_format != 'parquet':
+        path = path.with_name(path.name + COMPRESSIONS[compression])
+    return path
+
+
+def open_text(path: Union[str, os.PathLike],
+              mode: str = 'r',
+              compression: str = None) -> IO[str]:
+    if compression == 'gzip':
+        return gzip.open(path, mode=f'{mode}t', newline='', encoding='utf-8')
+    if compression == 'zstd':
+        if not zstandard:
+            raise RuntimeError('zstd compression requires the `zstandard` '
+                               'package: pip install zstandard')
+        return zstandard.open(path, mode=f'{mode}t', newline='',
+                              encoding='utf-8')
+    return open(path, mode=mode, newline='', encoding='utf-8')
+
+
+def iter_batches(items: Iterable[Any],
+                 batch_size: int) -> Iterator[List[Any]]:
+    items = iter(items)
+    while batch := list(islice(items, batch_size)):
+        yield batch
+
+
+def to_record(row: Dict[str, Any], header: List[str]) -> Dict[str, str]:
+    """
+    Returns the given row with the columns of the header as strings, the
+    same as they are written to the CSV.
+    """
+    record = {}
+    for column in header:
+        value = row.get(column)
+        record[column] = '' if value is None else str(value)
+    return record
+
+
+def write_board(board: Iterable[Dict[str, str]],
+                path: Union[str, os.PathLike],
+                header: List[str],
+                output_format: str = None,
+                compression: str = None,
+                batch_size: int = WRITE_BATCH_SIZE) -> int:
+    """
+    Writes the given board rows in batches to a CSV, JSON Lines or Parquet
+    file, optionally compressed.
+
+    :param board: Iterable of the rows
+    :param path: Path to the output file
+    :param header: Columns of the rows in order
+    :param output_format: Format of the output (from the path if not given)
+    :param compression: Compression of the output, `gzip` or `zstd` (from the
+        path if the format is not given)
+    :param batch_size: Number of rows written at once
+    :return: Number of the written rows
+    """
+    if not output_format:
+        output_format, compression = parse_output_format(path)
+    if output_format == 'parquet':
+        return write_board_parquet(board, path, header, compression,
+                                   batch_size)
+
+    rows_count = 0
+    with open_text(path, mode='w', compression=compression) as file:
+        if output_format == 'csv':
+            csv_writer = csv.DictWriter(file, fieldnames=header)
+            csv_writer.writeheader()
+            for batch in iter_batches(board, batch_size):
+                csv_writer.writerows(batch)
+                rows_count += len(batch)
+        else:
+            for batch in iter_batches(board, batch_size):
+                file.write(''.join(
+                    json.dumps(to_record(row, header),
+                               ensure_ascii=False) + '\n'
+                    for row in batch
+                ))
+                rows_count += len(batch)
+    return rows_count
+
+
+def write_board_parquet(board: Iterable[Dict[str, str]],
+                        path: Union[str, os.PathLike],
+                        header: List[str],
+                        compression: str = None,
+                        batch_size: int = WRITE_BATCH_SIZE) -> int:
+    if not pyarrow:
+        raise RuntimeError('Parquet output requires the `pyarrow` package: '
+                           'pip install pyarrow')
+    # All the columns are strings, as in the CSV
+    schema = pyarrow.schema([(column, pyarrow.string()) for column in header])
+    rows_count = 0
+    with pyarrow.parquet.ParquetWriter(
+            path, schema, compression=compression or 'snappy'
+    ) as parquet_writer:
+        for batch in iter_batches(board, batch_size):
+            parquet_writer.write_table(
+                pyarrow.Table.from_pylist(
+                    [to_record(row, header) for row in batch], schema=schema
+                )
+            )
+            rows_count += len(batch)
+    return rows_count
+
+
+def read_board(path: Union[str, os.PathLike]) -> Iterator[Dict[str, str]]:
+    """
+    Yields the rows of a board written by `write_board`.
+
+    :param path: Path to the CSV, JSON Lines or Parquet file
+    :return: Iterator of the rows
+    """
+    output_format, compression = parse_output_format(path)
+    if output_format == 'parquet':
+        if not pyarrow:
+            raise RuntimeError('Parquet input requires the `pyarrow` '
+                               'package: pip install pyarrow')
+        parquet_file = pyarrow.parquet.ParquetFile(path)
+        for batch in parquet_file.iter_batches():
+            yield from batch.to_pylist()
+        return
+
+    with open_text(path, mode='r', compression=compression) as file:
+        if output_format == 'csv':
+            yield from csv.DictReader(file)
+        else:
+            for line in file:
+                yield json.loads(line)
@@ -0,0 +1,81 @@
+import json
+import logging
+import os
+import pathlib
+import threading
+from typing import Dict, Any, Iterable, Tuple, Union
+
+
+class Journal:
+    def __init__(self, path: Union[str, os.PathLike], resume: bool = False):
+        """
+        Append-only JSON Lines journal of the retrieved card resources, each
+        written as soon as it arrives, so that a failed export can be resumed
+        without retrieving them again.
+
+        :param path: Path to the journal file
+        :param resume: Whether to keep the entries of the previous run, or to
+            start the journal over
+        """
+        self.path = pathlib.Path(path)
+        self.lock = threading.Lock()
+        self.entries: Dict[Tuple[str, str], Any] = {}
+        if resume and self.path.exists():
+            self.load()
+        self.file = open(self.path, mode='a' if resume else 'w',
+                         encoding='utf-8')
+        if self.file.tell():
+            # Do not append to a line cut by the failure
+            self.file.write('\n')
+
+    def load(self) -> None:
+        with open(self.path, mode='r', encoding='utf-8') as file:
+            for line in file:
+                if not line.strip():
+                    continue
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    logging.warning(f'Skipped a corrupt line of the journal '
+                                    f'{self.path}')
+                    continue
+                self.entries[entry['resource'], entry['card']] = entry['value']
+        print(f'Resuming with {len(self.entries)} Card resources from '
+              f'{self.path}\n')
+
+    def has(self, resource: str, card_id: str) -> bool:
+        return (resource, card_id) in self.entries
+
+    def get(self, resource: str, card_id: str) -> Any:
+        return self.entries[resource, card_id]
+
+    def write(self, entries: Iterable[Tuple[str, str, Any]]) -> None:
+        """
+        Appends the given resources to the journal.
+
+        :param entries: Iterable of the resource names, card Short Links and
+            the retrieved resources
+        """
+        lines = ''.join(json.dumps({'resource': resource,
+                                    'card': card_id,
+                                    'value': value}) + '\n'
+                        for resource, card_id, value in entries)
+        with self.lock:
+            self.file.write(lines)
+            self.file.flush()
+
+    def close(self) -> None:
+        self.file.close()
+
+    def remove(self) -> None:
+        """
+        Removes the journal once the export it covers has succeeded.
+        """
+        self.close()
+        self.path.unlink(missing_ok=True)
+
+    def __enter__(self) -> 'Journal':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
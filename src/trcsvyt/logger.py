@@ -1,6 +1,9 @@
 import logging
 import pathlib
+import queue
 import sys
+import threading
+import time
 from contextlib import ContextDecorator
 
 
@@ -19,9 +22,17 @@ def create_log_file_path(file_path,
 
 
 def config_logging(file_handle, file_path, mode='a', stream=sys.stdout,
-                   level=logging.INFO, name='root'):
-    logging_handlers = [OpenedFileHandler(file_handle, file_path, mode),
-                        logging.StreamHandler(stream)]
+                   level=logging.INFO, name='root', queued_stream=None,
+                   max_record_size=None):
+    if queued_stream:
+        # The queued stream writes to both the terminal and the file
+        logging_handlers = [logging.StreamHandler(queued_stream)]
+    else:
+        logging_handlers = [OpenedFileHandler(file_handle, file_path, mode),
+                            logging.StreamHandler(stream)]
+    if max_record_size:
+        for handler in logging_handlers:
+            handler.addFilter(TruncatingFilter(max_record_size))
     logging.basicConfig(
         handlers=logging_handlers,
         format='%(asctime)s %(name)s %(levelname)s %(message)s',
@@ -40,6 +51,102 @@ class OpenedFileHandler(logging.FileHandler):
         return self.file_handle
 
 
+class TruncatingFilter(logging.Filter):
+    def __init__(self, max_record_size):
+        super(TruncatingFilter, self).__init__()
+        self.max_record_size = max_record_size
+
+    def filter(self, record):
+        message = record.getMessage()
+        if len(message) > self.max_record_size:
+            record.msg = (f'{message[:self.max_record_size]}... '
+                          f'[{len(message) - self.max_record_size} '
+                          f'characters truncated]')
+            record.args = ()
+        return True
+
+
+class QueuedWriter:
+    def __init__(self, flush_interval=1.0, flush_size=64 * 1024):
+        """
+        Writes the messages to their buffers on a background thread, and
+        flushes the buffers every `flush_interval` seconds or `flush_size`
+        characters, whichever comes first.
+        """
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self.queue = queue.SimpleQueue()
+        self.closed = False
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def write(self, buffers, message):
+        if self.closed:
+            # Write synchronously the late messages, e.g. at interpreter exit
+            for buffer in buffers:
+                buffer.write(message)
+                buffer.flush()
+            return
+        self.queue.put((buffers, message))
+
+    def run(self):
+        dirty_buffers = set()
+        pending_size = 0
+        flushed_at = time.monotonic()
+        while True:
+            timeout = max(0.0, flushed_at + self.flush_interval
+                          - time.monotonic())
+            try:
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            if item:
+                buffers, message = item
+                for buffer in buffers:
+                    buffer.write(message)
+                    dirty_buffers.add(buffer)
+                pending_size += len(message)
+            if (item is None or pending_size >= self.flush_size
+                    or time.monotonic() - flushed_at >= self.flush_interval):
+                for buffer in dirty_buffers:
+                    buffer.flush()
+                dirty_buffers.clear()
+                pending_size = 0
+                flushed_at = time.monotonic()
+            if item is None and self.closed:
+                break
+
+    def close(self):
+        """
+        Writes and flushes the queued messages and stops the thread.
+        """
+        self.closed = True
+        # Wake the thread up to stop right away
+        self.queue.put(None)
+        self.thread.join()
+        # Write the messages queued meanwhile, if any
+        while not self.queue.empty():
+            item = self.queue.get()
+            if item:
+                self.write(*item)
+
+
+class QueuedStream:
+    def __init__(self, writer, *buffers):
+        self.writer = writer
+        self.buffers = buffers
+
+    def write(self, message):
+        self.writer.write(self.buffers, message)
+
+    def writelines(self, messages):
+        self.writer.write(self.buffers, ''.join(messages))
+
+    def flush(self):
+        # Flushed by the writer as per its flush policy
+        pass
+
+
 class StandardError:
     def __init__(self, buffer_stderr, buffer_file):
         self.buffer_stderr = buffer_stderr
@@ -86,24 +193,49 @@ class StandardOutput:
 
 class Logger(ContextDecorator):
     def __init__(self, module_path, mode='a',
-                 level=logging.INFO, name=None):
+                 level=logging.INFO, name=None,
+                 queued=False, flush_interval=1.0, flush_size=64 * 1024,
+                 max_record_size=None):
+        """
+        Tees the standard output and error, as well as the logging records,
+        to a log file of the given module.
+
+        :param queued: Whether to write on a background thread instead of
+            synchronously flushing on every write
+        :param flush_interval: Seconds between the flushes when queued
+        :param flush_size: Characters written between the flushes when queued
+        :param max_record_size: Characters beyond which the logging records
+            are truncated (e.g. the dumped payloads)
+        """
         self.module_path = module_path
         self.mode = mode
         self.level = level
         self.name = module_path if not name else name
+        self.queued = queued
 
         self.stdout_ = sys.stdout
         self.stderr_ = sys.stderr
         self.log_file_path = create_log_file_path(self.module_path)
         self.file_ = open(self.log_file_path, self.mode)
+        self.writer = None
+        queued_stdout = None
+        if self.queued:
+            self.writer = QueuedWriter(flush_interval, flush_size)
+            queued_stdout = QueuedStream(self.writer, self.stdout_, self.file_)
         config_logging(self.file_, self.log_file_path, self.mode, self.stdout_,
-                       self.level, self.name)
+                       self.level, self.name, queued_stdout, max_record_size)
 
     def __enter__(self):
-        sys.stdout = StandardOutput(self.stdout_, self.file_)
-        sys.stderr = StandardError(self.stderr_, self.file_)
+        if self.queued:
+            sys.stdout = QueuedStream(self.writer, self.stdout_, self.file_)
+            sys.stderr = QueuedStream(self.writer, self.stderr_, self.file_)
+        else:
+            sys.stdout = StandardOutput(self.stdout_, self.file_)
+            sys.stderr = StandardError(self.stderr_, self.file_)
 
     def __exit__(self, exc_type, exc_val, exc_tb):
         sys.stdout = self.stdout_
         sys.stderr = self.stderr_
+        if self.writer:
+            self.writer.close()
         # self.file_.close()  # Leave closing unhandled intentionally
@@ -0,0 +1,184 @@
+import datetime
+import json
+import os
+import pathlib
+import time
+from typing import List, Dict, Any, Union
+
+PROJECT_FIELD_FIELDS = \
+    'id,field(id,name,fieldType(id)),' \
+    'bundle(id,values(id,name),aggregatedUsers(id,login))'
+
+USER_FIELDS = 'id,login,name,email'
+
+# Mapping of the custom field types to the types of their Issue values
+ISSUE_FIELD_TYPES = {
+    'enum[1]': 'SingleEnumIssueCustomField',
+    'enum[*]': 'MultiEnumIssueCustomField',
+    'state[1]': 'StateIssueCustomField',
+    'user[1]': 'SingleUserIssueCustomField',
+    'user[*]': 'MultiUserIssueCustomField',
+    'version[1]': 'SingleVersionIssueCustomField',
+    'version[*]': 'MultiVersionIssueCustomField',
+    'ownedField[1]': 'SingleOwnedIssueCustomField',
+    'ownedField[*]': 'MultiOwnedIssueCustomField',
+    'build[1]': 'SingleBuildIssueCustomField',
+    'build[*]': 'MultiBuildIssueCustomField',
+    'date': 'DateIssueCustomField',
+    'date and time': 'DateIssueCustomField',
+    'period': 'PeriodIssueCustomField',
+}
+
+
+class ProjectMetadata:
+    def __init__(self,
+                 project_id: str,
+                 fields: Dict[str, Dict[str, Any]],
+                 users: Dict[str, str],
+                 fetched_at: float = None):
+        """
+        Custom fields, bundle values and users of a YouTrack project, to
+        resolve their names to IDs locally instead of per Issue.
+
+        :param project_id: Database ID of the project
+        :param fields: Mapping of the custom field names to their ID, type
+            and the mapping of their bundle value names to IDs
+        :param users: Mapping of the user logins to IDs
+        :param fetched_at: Time the metadata was retrieved at
+        """
+        self.project_id = project_id
+        self.fields = fields
+        self.users = users
+        self.fetched_at = fetched_at or time.time()
+
+    @classmethod
+    def from_api(cls,
+                 project_id: str,
+                 project_fields: List[Dict[str, Any]],
+                 users: List[Dict[str, Any]]) -> 'ProjectMetadata':
+        """
+        Builds the metadata from the project custom fields and the users as
+        returned by the YouTrack REST API.
+        """
+        fields = {}
+        for project_field in project_fields:
+            bundle = project_field.get('bundle') or {}
+            values = {value['name']: value['id']
+                      for value in bundle.get('values') or []}
+            # The user bundles list the users of the field instead
+            values.update({user['login']: user['id']
+                           for user in bundle.get('aggregatedUsers') or []})
+            field = project_field['field']
+            fields[field['name']] = {
+                'id': project_field['id'],
+                'type': field['fieldType']['id'],
+                'values': values,
+            }
+        return cls(project_id, fields,
+                   {user['login']: user['id'] for user in users})
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'project_id': self.project_id,
+                'fields': self.fields,
+                'users': self.users,
+                'fetched_at': self.fetched_at}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'ProjectMetadata':
+        return cls(data['project_id'], data['fields'], data['users'],
+                   data['fetched_at'])
+
+    @classmethod
+    def read(cls, path: Union[str, os.PathLike]) -> 'ProjectMetadata':
+        with open(path, 'r', encoding='utf-8') as file:
+            return cls.from_dict(json.load(file))
+
+    def write(self, path: Union[str, os.PathLike]) -> None:
+        path = pathlib.Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = path.with_suffix('.tmp')
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            json.dump(self.to_dict(), file)
+        os.replace(temp_path, path)
+
+    def is_fresh(self, ttl: float) -> bool:
+        return time.time() - self.fetched_at < ttl
+
+    def get_field(self, field_name: str) -> Dict[str, Any]:
+        try:
+            return self.fields[field_name]
+        except KeyError:
+            raise ValueError(f'Unknown custom field {field_name} of project '
+                             f'{self.project_id}') from None
+
+    def get_field_id(self, field_name: str) -> str:
+        return self.get_field(field_name)['id']
+
+    def get_value_id(self, field_name: str, value: str) -> str:
+        try:
+            return self.get_field(field_name)['values'][value]
+        except KeyError:
+            raise ValueError(f'Unknown value {value} of custom field '
+                             f'{field_name}') from None
+
+    def get_user_id(self, login: str) -> str:
+        try:
+            return self.users[login]
+        except KeyError:
+            raise ValueError(f'Unknown user {login}') from None
+
+    def build_custom_field(self,
+                           field_name: str,
+                           value: Any) -> Dict[str, Any]:
+        """
+        Returns the given custom field value in the format of the Issue
+        `customFields`, with its IDs resolved locally.
+
+        :param field_name: Name of the custom field
+        :param value: Name of the bundle value, login of the user, or the
+            value itself of the simple fields
+        :return: The custom field of the Issue
+        """
+        field = self.get_field(field_name)
+        field_type = field['type']
+        issue_field_type = ISSUE_FIELD_TYPES.get(field_type,
+                                                 'SimpleIssueCustomField')
+        if field_type.startswith('user'):
+            value = {'id': self.get_user_id(value)}
+        elif field['values'] or '[' in field_type:
+            value = {'id': self.get_value_id(field_name, value)}
+        elif field_type == 'integer':
+            value = int(value)
+        elif field_type == 'float':
+            value = float(value)
+        elif field_type.startswith('date'):
+            # Dates are Unix timestamps in milliseconds
+            date = datetime.datetime.fromisoformat(
+                str(value).replace('Z', '+00:00')
+            )
+            if date.tzinfo is None:
+                date = date.replace(tzinfo=datetime.timezone.utc)
+            value = int(date.timestamp() * 1000)
+        elif field_type == 'period':
+            value = {'presentation': str(value)}
+        if field_type.endswith('[*]'):
+            value = [value]
+        return {'$type': issue_field_type,
+                'id': field['id'],
+                'name': field_name,
+                'value': value}
+
+    def build_custom_fields(
+            self,
+            changes: Dict[str, Any]
+    ) -> List[Dict[str, Any]]:
+        """
+        Returns the given custom field changes in the format of the Issue
+        `customFields`.
+
+        :param changes: Mapping of the custom field names to their values
+        :return: List of the custom fields of the Issue
+        :raises ValueError: If a field or a value cannot be resolved
+        """
+        return [self.build_custom_field(field_name, value)
+                for field_name, value in changes.items()]
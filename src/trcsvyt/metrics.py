@@ -0,0 +1,222 @@
+import json
+import math
+import os
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Any, Tuple, Union, Iterator
+from urllib.parse import urlparse
+
+# Upper bounds in seconds of the request latency histogram buckets
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, math.inf)
+
+# Path segments followed by an ID, which are then collapsed into `{id}`
+COLLECTIONS = {
+    'actions', 'attachments', 'boards', 'cards', 'checklists', 'comments',
+    'customFields', 'download', 'issues', 'lists', 'members',
+    'organizations', 'projects', 'users', 'webhooks',
+}
+
+
+def normalize_endpoint(url: str) -> str:
+    """
+    Returns the endpoint of the given URL with its IDs collapsed, e.g.
+    `/1/cards/AbCd1234/actions?limit=10` to `/1/cards/{id}/actions`.
+    """
+    segments = urlparse(url).path.split('/')
+    for i in range(1, len(segments)):
+        if segments[i] and segments[i - 1] in COLLECTIONS \
+                and segments[i] not in COLLECTIONS:
+            segments[i] = '{id}'
+    return '/'.join(segments)
+
+
+class Metrics:
+    def __init__(self):
+        """
+        Thread-safe recorder of the per-endpoint request metrics and the
+        durations of the stages of a run.
+        """
+        self.lock = threading.Lock()
+        self.endpoints = {}
+        self.stages = {}
+
+    def endpoint(self, client: str, method: str,
+                 url: str) -> Dict[str, Any]:
+        key = (client, method, normalize_endpoint(url))
+        if key not in self.endpoints:
+            self.endpoints[key] = {
+                'statuses': Counter(),
+                'retries': Counter(),
+                'buckets': [0] * len(LATENCY_BUCKETS),
+                'latency_sum': 0.0,
+                'bytes_sent': 0,
+                'bytes_received': 0,
+                'cache_hits': 0,
+            }
+        return self.endpoints[key]
+
+    def record_request(self, client: str, method: str, url: str,
+                       status: Union[int, str], latency: float,
+                       bytes_sent: int, bytes_received: int) -> None:
+        with self.lock:
+            endpoint = self.endpoint(client, method, url)
+            endpoint['statuses'][str(status)] += 1
+            endpoint['latency_sum'] += latency
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if latency <= bound:
+                    endpoint['buckets'][i] += 1
+                    break
+            endpoint['bytes_sent'] += bytes_sent
+            endpoint['bytes_received'] += bytes_received
+
+    def record_retry(self, client: str, method: str, url: str,
+                     status: int) -> None:
+        with self.lock:
+            self.endpoint(client, method, url)['retries'][str(status)] += 1
+
+    def record_cache_hit(self, client: str, method: str, url: str) -> None:
+        with self.lock:
+            self.endpoint(client, method, url)['cache_hits'] += 1
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """
+        Records the wall time of the wrapped stage of a run.
+        """
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.stages[name] = (self.stages.get(name, 0.0)
+                                     + time.perf_counter() - started_at)
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self.lock:
+            endpoints = []
+            for (client, method, endpoint), values in self.endpoints.items():
+                count = sum(values['statuses'].values())
+                endpoints.append({
+                    'client': client,
+                    'method': method,
+                    'endpoint': endpoint,
+                    'requests': count,
+                    'statuses': dict(values['statuses']),
+                    'retries': dict(values['retries']),
+                    'cache_hits': values['cache_hits'],
+                    'latency_mean': (values['latency_sum'] / count
+                                     if count else 0.0),
+                    'latency_buckets': {
+                        str(bound): bucket_count for bound, bucket_count
+                        in zip(LATENCY_BUCKETS, values['buckets'])
+                    },
+                    'bytes_sent': values['bytes_sent'],
+                    'bytes_received': values['bytes_received'],
+                })
+            return {'endpoints': endpoints, 'stages': dict(self.stages)}
+
+    def write_json(self, path: Union[str, os.PathLike]) -> None:
+        with open(path, 'w') as file:
+            json.dump(self.to_dict(), file, indent=2)
+
+    def write_prometheus(self, path: Union[str, os.PathLike]) -> None:
+        """
+        Writes the metrics in the Prometheus text format, e.g. for the
+        textfile collector of the Node exporter.
+        """
+        lines = []
+
+        def add_metric(name: str, metric_type: str, help_: str,
+                       samples: Iterator[Tuple[str, Dict[str, str], float]]):
+            lines.append(f'# HELP {name} {help_}')
+            lines.append(f'# TYPE {name} {metric_type}')
+            for suffix, labels, value in samples:
+                labels = ','.join(f'{key}="{label}"'
+                                  for key, label in labels.items())
+                lines.append(f'{name}{suffix}{{{labels}}} {value}')
+
+        with self.lock:
+            endpoints = [({'client': client, 'method': method,
+                           'endpoint': endpoint}, values)
+                         for (client, method, endpoint), values
+                         in self.endpoints.items()]
+            stages = dict(self.stages)
+
+        add_metric('trcsvyt_requests_total', 'counter',
+                   'Number of HTTP requests sent.',
+                   (('', {**labels, 'status': status}, count)
+                    for labels, values in endpoints
+                    for status, count in values['statuses'].items()))
+        add_metric('trcsvyt_retries_total', 'counter',
+                   'Number of HTTP requests retried.',
+                   (('', {**labels, 'status': status}, count)
+                    for labels, values in endpoints
+                    for status, count in values['retries'].items()))
+        add_metric('trcsvyt_cache_hits_total', 'counter',
+                   'Number of HTTP requests served from the cache.',
+                   (('', labels, values['cache_hits'])
+                    for labels, values in endpoints))
+        add_metric('trcsvyt_request_bytes_total', 'counter',
+                   'Number of bytes sent in the HTTP request bodies.',
+                   (('', labels, values['bytes_sent'])
+                    for labels, values in endpoints))
+        add_metric('trcsvyt_response_bytes_total', 'counter',
+                   'Number of bytes received in the HTTP response bodies.',
+                   (('', labels, values['bytes_received'])
+                    for labels, values in endpoints))
+
+        def histogram_samples():
+            for labels, values in endpoints:
+                cumulative_count = 0
+                for bound, count in zip(LATENCY_BUCKETS, values['buckets']):
+                    cumulative_count += count
+                    le = '+Inf' if bound == math.inf else str(bound)
+                    yield '_bucket', {**labels, 'le': le}, cumulative_count
+                yield '_sum', labels, values['latency_sum']
+                yield '_count', labels, cumulative_count
+
+        add_metric('trcsvyt_request_duration_seconds', 'histogram',
+                   'Latency of the HTTP requests.', histogram_samples())
+        add_metric('trcsvyt_stage_duration_seconds', 'gauge',
+                   'Wall time of the stages of the run.',
+                   (('', {'stage': stage}, duration)
+                    for stage, duration in stages.items()))
+        with open(path, 'w') as file:
+            file.write('\n'.join(lines) + '\n')
+
+
+class Progress:
+    def __init__(self, label: str, total: int = None, every: int = 10):
+        """
+        Prints the progress of a long-running loop along with its throughput
+        and ETA.
+
+        :param label: Label of the progress lines
+        :param total: Total number of items (no ETA if not given)
+        :param every: Number of items between the progress lines
+        """
+        self.label = label
+        self.total = total
+        self.every = every
+        self.count = 0
+        self.started_at = time.perf_counter()
+        self.lock = threading.Lock()
+
+    def update(self, count: int = 1) -> None:
+        with self.lock:
+            previous_count = self.count
+            self.count += count
+            if (self.count // self.every == previous_count // self.every
+                    and self.count != self.total):
+                return
+            elapsed = time.perf_counter() - self.started_at
+            throughput = self.count / elapsed if elapsed else 0.0
+            line = f'{self.label}: {self.count}'
+            if self.total:
+                line += f'/{self.total}'
+            line += f' ({throughput:.1f}/s'
+            if self.total and throughput:
+                line += f', ETA {(self.total - self.count) / throughput:.0f}s'
+            print(line + ')')
@@ -0,0 +1,143 @@
+from typing import Tuple, List, Dict, Any
+
+
+class Card:
+    # Slots rather than a per-instance dict keep large boards compact
+    __slots__ = ('id_short', 'number', 'short_link', 'author', 'created',
+                 'summary', 'description', 'sprint', 'story_points',
+                 'assignees', 'due')
+
+    def __init__(self,
+                 id_short: str,
+                 short_link: str,
+                 author: str,
+                 created: str,
+                 summary: str,
+                 description: str,
+                 sprint: str,
+                 story_points: str,
+                 assignees: Tuple[str, ...],
+                 due: str):
+        """
+        Trello card parsed for the export, with the fields in the format of
+        the exported CSV.
+
+        :param id_short: Card number on the board
+        :param short_link: Card Short Link
+        :param author: YouTrack username of the card creator
+        :param created: Creation date of the card
+        :param summary: Card name
+        :param description: Card description
+        :param sprint: Name of the card list
+        :param story_points: Story Points of the card
+        :param assignees: YouTrack usernames of the card members
+        :param due: Due date of the card
+        """
+        self.id_short = id_short
+        # Numeric sort key, parsed once rather than per row
+        self.number = int(id_short) if id_short.isdigit() else 0
+        self.short_link = short_link
+        self.author = author
+        self.created = created
+        self.summary = summary
+        self.description = description
+        self.sprint = sprint
+        self.story_points = story_points
+        self.assignees = assignees
+        self.due = due
+
+    def __repr__(self) -> str:
+        return f'Card({self.id_short}, {self.short_link})'
+
+
+class BoardIndex:
+    __slots__ = ('lists', 'members')
+
+    def __init__(self,
+                 lists: List[Dict[str, Any]],
+                 members: List[Dict[str, Any]]):
+        """
+        Index of the lists and members of a board, resolving the list and
+        members of its cards locally from their `idList` and `idMembers`
+        instead of a request per card.
+
+        :param lists: Lists of the board
+        :param members: Members of the board
+        """
+        self.lists = {list_['id']: list_ for list_ in lists}
+        self.members = {member['id']: member for member in members}
+
+    def get_card_list(self, card: Dict[str, Any]) -> Dict[str, Any]:
+        return self.lists.get(card.get('idList'), {})
+
+    def get_card_members(self, card: Dict[str, Any]) -> List[Dict[str, Any]]:
+        return [self.members[member_id]
+                for member_id in card.get('idMembers', [])
+                if member_id in self.members]
+
+    def has_card_members(self, card: Dict[str, Any]) -> bool:
+        """
+        Tells whether all the members of the given card are known, as the
+        members who left the board still stay on its cards.
+        """
+        return all(member_id in self.members
+                   for member_id in card.get('idMembers', []))
+
+
+class Comment:
+    __slots__ = ('id', 'card_number', 'author', 'created', 'text')
+
+    def __init__(self,
+                 id_: str,
+                 card_number: str,
+                 author: str,
+                 created: str,
+                 text: str):
+        """
+        Trello card comment parsed for the migration to YouTrack.
+
+        :param id_: ID of the comment action
+        :param card_number: Number of the commented card on the board
+        :param author: YouTrack username of the comment author
+        :param created: Creation date of the comment
+        :param text: Comment text
+        """
+        self.id = id_
+        self.card_number = card_number
+        self.author = author
+        self.created = created
+        self.text = text
+
+    def __repr__(self) -> str:
+        return f'Comment({self.id}, {self.card_number})'
+
+
+class Attachment:
+    __slots__ = ('id', 'card_number', 'name', 'url', 'size', 'mime_type')
+
+    def __init__(self,
+                 id_: str,
+                 card_number: str,
+                 name: str,
+                 url: str,
+                 size: int,
+                 mime_type: str):
+        """
+        File uploaded to a Trello card, parsed for the migration to YouTrack.
+
+        :param id_: ID of the attachment
+        :param card_number: Number of the card on the board
+        :param name: File name
+        :param url: Download URL of the file
+        :param size: Size of the file in bytes
+        :param mime_type: MIME type of the file
+        """
+        self.id = id_
+        self.card_number = card_number
+        self.name = name
+        self.url = url
+        self.size = size
+        self.mime_type = mime_type
+
+    def __repr__(self) -> str:
+        return f'Attachment({self.id}, {self.card_number})'
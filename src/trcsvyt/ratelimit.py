@@ -0,0 +1,129 @@
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+import requests
+
+# Statuses worth retrying as they are transient
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Methods safe to retry on a server error, as they have no side effects
+IDEMPOTENT_METHODS = {'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'}
+
+
+class RateGovernor:
+    def __init__(self,
+                 rate: float = None,
+                 burst: int = 1,
+                 max_retries: int = 5,
+                 backoff_base: float = 1.0,
+                 backoff_max: float = 60.0):
+        """
+        Token bucket shared by all the threads of a client to keep the request
+        rate within the limits of the API. It also pauses all the requests
+        when the API asks to (`Retry-After` or an exhausted rate limit).
+
+        :param rate: Sustained number of requests per second (unlimited if not
+            given)
+        :param burst: Number of requests allowed at once beyond the rate
+        :param max_retries: Number of retries of the transient failures
+        :param backoff_base: Base delay in seconds of the exponential backoff
+        :param backoff_max: Maximum delay in seconds of a single retry
+        """
+        self.rate = rate
+        self.burst = burst
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self.lock = threading.Lock()
+        self.tokens = float(burst)
+        self.updated_at = time.monotonic()
+        self.paused_until = 0.0
+
+    def acquire(self) -> None:
+        """
+        Blocks until a request is allowed to be sent.
+        """
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    wait = self.paused_until - now
+                elif self.rate is None:
+                    return
+                else:
+                    self.tokens = min(self.burst,
+                                      self.tokens
+                                      + (now - self.updated_at) * self.rate)
+                    self.updated_at = now
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait = (1 - self.tokens) / self.rate
+            # Sleep without the lock, so that the other threads can still
+            # record a pause meanwhile
+            time.sleep(wait)
+
+    def pause(self, seconds: float) -> None:
+        with self.lock:
+            self.paused_until = max(self.paused_until,
+                                    time.monotonic() + seconds)
+
+    def observe(self, response: requests.Response) -> None:
+        """
+        Pauses the requests if the given response tells the rate limit is hit.
+        """
+        retry_after = parse_retry_after(response)
+        if retry_after is not None:
+            self.pause(retry_after)
+            return
+        # Trello reports e.g. `x-rate-limit-api-token-remaining` along with
+        # `x-rate-limit-api-token-interval-ms` per limit (key and token)
+        for name, value in response.headers.items():
+            name = name.lower()
+            if not (name.startswith('x-rate-limit-')
+                    and name.endswith('-remaining')):
+                continue
+            interval = response.headers.get(
+                name.replace('-remaining', '-interval-ms')
+            )
+            if value.strip() == '0' and interval:
+                self.pause(int(interval) / 1000)
+
+    def backoff(self, attempt: int, response: requests.Response) -> float:
+        """
+        Returns the delay in seconds before retrying the given response.
+        """
+        retry_after = parse_retry_after(response)
+        # Full jitter to spread the retries of the concurrent requests
+        delay = random.uniform(0, min(self.backoff_max,
+                                      self.backoff_base * 2 ** attempt))
+        return delay if retry_after is None else retry_after + delay
+
+    def should_retry(self, attempt: int, response: requests.Response) -> bool:
+        if attempt >= self.max_retries:
+            return False
+        if response.status_code == 429:
+            return True
+        return (response.status_code in RETRY_STATUSES
+                and response.request.method in IDEMPOTENT_METHODS)
+
+
+def parse_retry_after(response: requests.Response) -> Optional[float]:
+    if response.status_code not in (429, 503):
+        return None
+    retry_after = response.headers.get('Retry-After')
+    if not retry_after:
+        return None
+    try:
+        return max(0.0, float(retry_after))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(retry_after).timestamp()
+                   - time.time())
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,50 @@
+import heapq
+import json
+import tempfile
+from typing import Iterable, Iterator, Callable, Any, IO
+
+
+def write_run(items: Iterable[Any]) -> IO[str]:
+    file = tempfile.TemporaryFile(mode='w+', encoding='utf-8')
+    for item in items:
+        file.write(json.dumps(item) + '\n')
+    file.seek(0)
+    return file
+
+
+def read_run(file: IO[str]) -> Iterator[Any]:
+    for line in file:
+        yield json.loads(line)
+
+
+def external_sort(items: Iterable[Any],
+                  key: Callable[[Any], Any],
+                  chunk_size: int = 10_000) -> Iterator[Any]:
+    """
+    Sorts the given items with bounded memory: sorted runs of `chunk_size`
+    items are spilled to temporary files and then lazily merged.
+    The sort is stable like `sorted`.
+
+    :param items: Iterable of the JSON-serializable items to sort
+    :param key: Function returning the sort key of an item
+    :param chunk_size: Maximum number of items held in memory
+    :return: Iterator of the sorted items
+    """
+    runs = []
+    chunk = []
+    try:
+        for item in items:
+            chunk.append(item)
+            if len(chunk) >= chunk_size:
+                runs.append(write_run(sorted(chunk, key=key)))
+                chunk = []
+        if not runs:
+            # Everything fits in memory, so skip the temporary files
+            yield from sorted(chunk, key=key)
+            return
+        runs.append(write_run(sorted(chunk, key=key)))
+        chunk = []
+        yield from heapq.merge(*(read_run(run) for run in runs), key=key)
+    finally:
+        for run in runs:
+            run.close()
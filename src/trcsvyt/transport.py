@@ -0,0 +1,111 @@
+import logging
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from src.trcsvyt.cache import ResponseCache
+from src.trcsvyt.metrics import Metrics
+from src.trcsvyt.ratelimit import RateGovernor
+
+
+class TransportAdapter(HTTPAdapter):
+    def __init__(self,
+                 cache: ResponseCache = None,
+                 governor: RateGovernor = None,
+                 metrics: Metrics = None,
+                 client: str = None,
+                 **kwargs):
+        """
+        HTTP adapter shared by the Trello and YouTrack sessions.
+        Serves GET requests from the given cache, if any, and revalidates the
+        stale cached responses with ETag/Last-Modified.
+        Sends the other requests through the given rate governor, if any, and
+        retries the transient failures with backoff.
+
+        :param cache: Cache of the responses (disabled if not given)
+        :param governor: Rate governor of the requests (disabled if not given)
+        :param metrics: Recorder of the request metrics (disabled if not
+            given)
+        :param client: Name of the client to label the metrics with
+        :param kwargs: Keyword arguments of `HTTPAdapter`
+        """
+        self.cache = cache
+        self.governor = governor
+        self.metrics = metrics
+        self.client = client
+        super(TransportAdapter, self).__init__(**kwargs)
+
+    def send(self, request: requests.PreparedRequest,
+             **kwargs) -> requests.Response:
+        # Leave the streamed downloads out of the cache
+        if (self.cache is None or request.method != 'GET'
+                or kwargs.get('stream')):
+            return self.send_governed(request, **kwargs)
+
+        key = self.cache.key(request)
+        entry = self.cache.get(key)
+        if entry and self.cache.is_fresh(entry):
+            if self.metrics:
+                self.metrics.record_cache_hit(self.client, request.method,
+                                              request.url)
+            return self.cache.build_response(request, entry)
+        if entry:
+            request.headers.update(self.cache.validators(entry))
+
+        response = self.send_governed(request, **kwargs)
+        if response.status_code == 304 and entry:
+            self.cache.touch(key, entry)
+            return self.cache.build_response(request, entry)
+        if response.status_code == 200:
+            self.cache.set(key, response)
+        return response
+
+    def send_governed(self, request: requests.PreparedRequest,
+                      **kwargs) -> requests.Response:
+        if self.governor is None:
+            return self.send_measured(request, **kwargs)
+
+        attempt = 0
+        while True:
+            self.governor.acquire()
+            response = self.send_measured(request, **kwargs)
+            self.governor.observe(response)
+            if not self.governor.should_retry(attempt, response):
+                return response
+            if self.metrics:
+                self.metrics.record_retry(self.client, request.method,
+                                          request.url, response.status_code)
+            delay = self.governor.backoff(attempt, response)
+            logging.warning(f'Retrying {request.method} '
+                            f'{request.path_url.split("?")[0]} '
+                            f'({response.status_code}) in {delay:.1f}s')
+            response.close()
+            time.sleep(delay)
+            attempt += 1
+
+    def send_measured(self, request: requests.PreparedRequest,
+                      **kwargs) -> requests.Response:
+        if self.metrics is None:
+            return super(TransportAdapter, self).send(request, **kwargs)
+
+        bytes_sent = len(request.body or b'')
+        started_at = time.perf_counter()
+        try:
+            response = super(TransportAdapter, self).send(request, **kwargs)
+        except requests.RequestException:
+            self.metrics.record_request(self.client, request.method,
+                                        request.url, 'error',
+                                        time.perf_counter() - started_at,
+                                        bytes_sent, 0)
+            raise
+        if kwargs.get('stream'):
+            # Do not consume the streamed downloads
+            bytes_received = int(response.headers.get('Content-Length', 0))
+        else:
+            bytes_received = len(response.content)
+        self.metrics.record_request(self.client, request.method, request.url,
+                                    response.status_code,
+                                    time.perf_counter() - started_at,
+                                    bytes_sent, bytes_received)
+        return response
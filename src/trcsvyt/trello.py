@@ -1,11 +1,26 @@
 import csv
+import hashlib
 import json
 import logging
 import os
-from typing import Tuple, List, Dict, Union, Any
+import pathlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from operator import itemgetter
+from typing import (Tuple, List, Dict, Union, Any, Iterable, Iterator,
+                    Optional)
+from urllib.parse import quote, urlencode
 
 import requests
 
+from src.trcsvyt.cache import ResponseCache
+from src.trcsvyt.formats import write_board, read_board
+from src.trcsvyt.journal import Journal
+from src.trcsvyt.metrics import Metrics, Progress
+from src.trcsvyt.models import Card, BoardIndex, Comment, Attachment
+from src.trcsvyt.ratelimit import RateGovernor
+from src.trcsvyt.stream import external_sort
+from src.trcsvyt.transport import TransportAdapter
+
 # For a complete list of Action Types refer to:
 # https://developer.atlassian.com/cloud/trello/guides/rest-api/action-types
 ACTION_TYPES = {
@@ -14,18 +29,54 @@ ACTION_TYPES = {
     'comment_card': 'commentCard',
 }
 
+CARD_FIELDS = ['all']
+
+ACTION_FIELDS = ['all']
+
 LIST_FIELDS = ['all']
 
 MEMBER_FIELDS = ['all']
 
+ATTACHMENT_FIELDS = ['name', 'url', 'bytes', 'mimeType', 'isUpload']
+
+# Size in bytes of the chunks the attachments are streamed to disk in
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+# Maximum number of items Trello returns per page of a paginated resource
+PAGE_LIMIT = 1000
+
+# Maximum number of routes Trello accepts per `/batch` request
+BATCH_LIMIT = 10
+
+# Trello allows 100 requests per 10 seconds per token over a sliding window:
+# https://developer.atlassian.com/cloud/trello/guides/rest-api/rate-limits
+# Any 10 seconds then see at most `RATE_BURST + 10 * RATE_LIMIT` requests.
+RATE_LIMIT = 9
+RATE_BURST = 10
+
 # Story Points Power-Up (plugin) free:
 # https://trello.com/power-ups/59d4ef8cfea15a55b0086614
 AGILE_TOOLS_PLUGIN_ID = '59d4ef8cfea15a55b0086614'
 
 
+def require_fields(fields: List[str], required: List[str]) -> str:
+    """
+    Returns the given fields, along with the required ones if projected,
+    joined as a query parameter.
+    """
+    if 'all' in fields:
+        return 'all'
+    return ','.join([*fields, *(field for field in required
+                                if field not in fields)])
+
+
 class Trello:
     def __init__(self, api_base_url: str = 'https://api.trello.com/1',
-                 api_key: str = None, api_token=None):
+                 api_key: str = None, api_token=None,
+                 max_workers: int = 8, batch_size: int = BATCH_LIMIT,
+                 cache: ResponseCache = None,
+                 governor: RateGovernor = None,
+                 metrics: Metrics = None):
         """
         Adapter class for Trello.
         Follow Trello's REST API documentation to obtain an API key and token:
@@ -34,20 +85,252 @@ class Trello:
         :param api_base_url: Trello API base URL
         :param api_key: Trello API key
         :param api_token: Trello API token
+        :param max_workers: Number of concurrent requests of the bulk methods
+        :param batch_size: Number of per-card requests of the bulk methods
+            packed into a single `/batch` request (1 disables batching)
+        :param cache: On-disk cache of the GET responses (disabled if not
+            given)
+        :param governor: Rate governor of the requests (defaults to one within
+            the Trello rate limits)
+        :param metrics: Recorder of the request metrics (disabled if not
+            given)
         """
         self.api_base_url = api_base_url
         self.api_key = api_key
         self.api_token = api_token
         if not api_base_url or not api_key or not api_token:
             raise ValueError('Base URL, API Key, and API token are required')
+        if max_workers < 1:
+            raise ValueError('At least one worker is required')
+        if not 1 <= batch_size <= BATCH_LIMIT:
+            raise ValueError(f'Batch size must be between 1 and {BATCH_LIMIT}')
+        self.max_workers = max_workers
+        self.batch_size = batch_size
+        # Shared by all the bulk calls, e.g. of several boards at once, to
+        # bound the concurrent requests of the client as a whole
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.cache = cache
+        self.governor = governor or RateGovernor(rate=RATE_LIMIT,
+                                                 burst=RATE_BURST)
+        self.metrics = metrics
+
+        self.session = self.init_session()
+
+    def init_session(self) -> requests.Session:
+        session = requests.Session()
+        session.params = {'key': self.api_key, 'token': self.api_token}
+        # Keep one pooled connection per worker to reuse them across requests
+        adapter = TransportAdapter(cache=self.cache,
+                                   governor=self.governor,
+                                   metrics=self.metrics,
+                                   client='trello',
+                                   pool_connections=self.max_workers,
+                                   pool_maxsize=self.max_workers)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
 
     def request(self, method: str, url: str, **kwargs) -> requests.Response:
-        kwargs['params'] = {'key': self.api_key,
-                            'token': self.api_token,
-                            **kwargs.get('params', {})}
-        return requests.request(method,
-                                f'{self.api_base_url}{url}',
-                                **kwargs)
+        return self.session.request(method,
+                                    f'{self.api_base_url}{url}',
+                                    **kwargs)
+
+    def get_route(self, url: str, params: Dict[str, Any] = None) -> Any:
+        """
+        Retrieves the given GET route on its own.
+
+        :return: The response, or `None` if the route is not found (e.g. the
+            card was deleted meanwhile)
+        :raises requests.HTTPError: If the route failed otherwise
+        """
+        response = self.request(method='GET', url=url, params=params)
+        if response.status_code == 404:
+            logging.error(f'Failed to retrieve {url}: not found')
+            return None
+        response.raise_for_status()
+        return response.json()
+
+    def get_batch(
+            self,
+            routes: List[Tuple[str, Dict[str, Any]]]
+    ) -> List[Optional[Any]]:
+        """
+        Retrieves the given GET routes in a single `/batch` request.
+        The routes failed within the batch are retried one by one, so a single
+        failure does not fail the whole batch.
+
+        :param routes: List of the routes (relative to the API base URL) each
+            along with its query parameters
+        :return: List of the responses in the order of the given routes, with
+            `None` for the routes not found on their own either
+        """
+        if len(routes) == 1:
+            return [self.get_route(*routes[0])]
+
+        # Encode each route entirely, since they are separated by commas
+        urls = ','.join(quote(f'{url}?{urlencode(params)}' if params else url,
+                              safe='')
+                        for url, params in routes)
+        response = self.request(method='GET', url=f'/batch?urls={urls}')
+        response.raise_for_status()
+        entries = response.json()
+        if len(entries) != len(routes):
+            logging.warning(f'Retrieved {len(entries)} responses in batch '
+                            f'for {len(routes)} routes, retrying them one by '
+                            f'one')
+            return [self.get_route(url, params) for url, params in routes]
+        results = []
+        for (url, params), entry in zip(routes, entries):
+            if '200' in entry:
+                results.append(entry['200'])
+                continue
+            logging.warning(f'Failed to retrieve {url} in batch: {entry}')
+            results.append(self.get_route(url, params))
+        return results
+
+    def get_cards_resources_bulk(
+            self,
+            cards: List[Dict[str, Any]],
+            resources: Dict[str, Tuple[str, Dict[str, Any]]],
+            journal: Journal = None
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        Concurrently retrieves the given resources for every given card.
+
+        :param cards: List of the cards to get the resources for
+        :param resources: Mapping of resource names to the card sub-path
+            (e.g. `/actions`) and the query parameters of the request
+        :param journal: Journal to skip the resources already retrieved by a
+            failed previous run, and to record the retrieved ones to
+        :return: Mapping of resource names to the mappings of card Short Links
+            to the retrieved resource (without the cards not found)
+        :raises requests.HTTPError: If a resource failed otherwise, once the
+            started batches are journaled
+        """
+        resources_mapping = {name: {} for name in resources}
+        jobs = []
+        for name, (path, params) in resources.items():
+            for card in cards:
+                card_id = card['shortLink']
+                if journal and journal.has(name, card_id):
+                    resources_mapping[name][card_id] = journal.get(name,
+                                                                   card_id)
+                else:
+                    jobs.append((name, card_id, path, params))
+        progresses = {name: Progress(name, total=len(cards)
+                                     - len(resources_mapping[name]))
+                      for name in resources}
+        futures = {}
+        for i in range(0, len(jobs), self.batch_size):
+            batch = jobs[i:i + self.batch_size]
+            future = self.executor.submit(
+                self.get_batch,
+                [(f'/cards/{card_id}{path}', params)
+                 for _, card_id, path, params in batch]
+            )
+            futures[future] = batch
+        error = None
+        for future in as_completed(futures):
+            if future.cancelled():
+                continue
+            batch = futures[future]
+            try:
+                results = list(zip(batch, future.result()))
+            except Exception as batch_error:
+                if error is None:
+                    error = batch_error
+                    # Leave the batches not started yet to the resumed run,
+                    # while the started ones are still journaled
+                    for other_future in futures:
+                        other_future.cancel()
+                continue
+            # The resources not found (e.g. of the deleted cards) are left
+            # out, so neither journaled nor parsed
+            if journal:
+                journal.write((name, card_id, result)
+                              for (name, card_id, _, _), result in results
+                              if result is not None)
+            for (name, card_id, _, _), result in results:
+                if result is not None:
+                    resources_mapping[name][card_id] = result
+                progresses[name].update()
+        if error is not None:
+            raise error
+        for name in resources:
+            print(f'Finished retrieving Cards {name}\n')
+        return resources_mapping
+
+    def get_cards_details_bulk(
+            self,
+            cards: List[Dict[str, Any]],
+            list_fields: List[str] = None,
+            action_types: List[str] = None,
+            action_limit: int = 1000,
+            member_fields: List[str] = None,
+            action_fields: List[str] = None,
+            board_index: BoardIndex = None,
+            journal: Journal = None
+    ) -> Tuple[Dict[str, Dict[str, Any]],
+               Dict[str, List[Dict[str, Any]]],
+               Dict[str, List[Dict[str, Any]]],
+               Dict[str, List[Dict[str, Any]]]]:
+        """
+        Retrieves the list, actions, members and Power-Ups of the given cards
+        all in parallel.
+
+        :param cards: List of the cards to get the resources for
+        :param list_fields: Fields of the lists to retrieve
+        :param action_types: Types of the actions to retrieve
+        :param action_limit: Maximum number of actions per card
+        :param member_fields: Fields of the members (and the action creators)
+            to retrieve
+        :param action_fields: Fields of the actions to retrieve
+        :param board_index: Index of the board to resolve the lists and
+            members from instead of retrieving them per card (the cards then
+            need their `idList` and `idMembers`)
+        :param journal: Journal of the retrieved resources to resume from
+        :return: Mappings of card Short Links to the list, actions, members
+            and Power-Ups (Plugins) respectively
+        """
+        list_fields = ','.join(list_fields or LIST_FIELDS)
+        member_fields = ','.join(member_fields or MEMBER_FIELDS)
+        resources = {
+            'Actions': ('/actions', {
+                'filter': ','.join(action_types or ACTION_TYPES.values()),
+                'fields': ','.join(action_fields or ACTION_FIELDS),
+                'memberCreator_fields': member_fields,
+                'limit': action_limit
+            }),
+            'Power-Ups': ('/pluginData', {}),
+        }
+        if not board_index:
+            resources['List'] = ('/list', {'fields': list_fields})
+            resources['Members'] = ('/members', {'fields': member_fields})
+        resources_mapping = self.get_cards_resources_bulk(cards, resources,
+                                                         journal)
+
+        if board_index:
+            resources_mapping['List'] = {
+                card['shortLink']: board_index.get_card_list(card)
+                for card in cards
+            }
+            resources_mapping['Members'] = {
+                card['shortLink']: board_index.get_card_members(card)
+                for card in cards
+            }
+            # Only the cards of the members who left the board need requests
+            unknown_cards = [card for card in cards
+                             if not board_index.has_card_members(card)]
+            if unknown_cards:
+                resources_mapping['Members'].update(
+                    self.get_cards_members_bulk(unknown_cards,
+                                                member_fields.split(','),
+                                                journal)
+                )
+        return (resources_mapping['List'],
+                resources_mapping['Actions'],
+                resources_mapping['Members'],
+                resources_mapping['Power-Ups'])
 
     @staticmethod
     def read_users_mapping(
@@ -62,18 +345,406 @@ class Trello:
                 users_mapping[row[0]] = row[1]
         return users_mapping
 
-    def get_board_cards(self, board_id: str) -> List[Dict[str, Any]]:
+    @staticmethod
+    def read_board_csv(
+            csv_path: Union[str, bytes, os.PathLike]
+    ) -> List[Dict[str, str]]:
+        with open(csv_path, mode='r', newline='', encoding='utf-8') as file:
+            return list(csv.DictReader(file))
+
+    @staticmethod
+    def read_board(path: Union[str, os.PathLike]) -> List[Dict[str, str]]:
+        """
+        Reads the board exported to a CSV, JSON Lines or Parquet file,
+        optionally compressed.
+        """
+        return list(read_board(path))
+
+    def get_board_cards(self,
+                        board_id: str,
+                        card_fields: List[str] = None) -> List[Dict[str, Any]]:
+        card_fields = ','.join(card_fields or CARD_FIELDS)
+        response = self.request(method='GET',
+                                url=f'/boards/{board_id}/cards',
+                                params={'fields': card_fields})
+        response.raise_for_status()
+        return response.json()
+
+    def iter_paginated(
+            self,
+            url: str,
+            params: Dict[str, Any] = None,
+            page_limit: int = PAGE_LIMIT
+    ) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Yields the pages of a paginated resource by walking them backwards with
+        the `before` parameter.
+
+        :param url: URL of the resource relative to the API base URL
+        :param params: Query parameters of the requests
+        :param page_limit: Maximum number of items per page
+        :return: Iterator of the pages each as a list of items
+        """
+        params = {**(params or {}), 'limit': page_limit}
+        while True:
+            response = self.request(method='GET', url=url, params=params)
+            response.raise_for_status()
+            page = response.json()
+            if page:
+                yield page
+            if len(page) < page_limit:
+                break
+            # Trello IDs start with a timestamp, so the smallest one is oldest
+            params['before'] = min(item['id'] for item in page)
+
+    def get_paginated(self,
+                      url: str,
+                      params: Dict[str, Any] = None,
+                      page_limit: int = PAGE_LIMIT) -> List[Dict[str, Any]]:
+        """
+        Returns all the items of a paginated resource.
+
+        :param url: URL of the resource relative to the API base URL
+        :param params: Query parameters of the requests
+        :param page_limit: Maximum number of items per page
+        :return: List of all the items
+        """
+        return [item
+                for page in self.iter_paginated(url, params, page_limit)
+                for item in page]
+
+    def get_board_lists(self,
+                        board_id: str,
+                        list_fields: List[str] = None) -> List[Dict[str, Any]]:
+        list_fields = require_fields(list_fields or LIST_FIELDS, ['id'])
+        response = self.request(method='GET',
+                                url=f'/boards/{board_id}/lists',
+                                params={'filter': 'all',
+                                        'fields': list_fields})
+        response.raise_for_status()
+        return response.json()
+
+    def get_board_members(
+            self,
+            board_id: str,
+            member_fields: List[str] = None
+    ) -> List[Dict[str, Any]]:
+        member_fields = require_fields(member_fields or MEMBER_FIELDS, ['id'])
+        response = self.request(method='GET',
+                                url=f'/boards/{board_id}/members',
+                                params={'fields': member_fields})
+        response.raise_for_status()
+        return response.json()
+
+    def get_board_index(self,
+                        board_id: str,
+                        list_fields: List[str] = None,
+                        member_fields: List[str] = None) -> BoardIndex:
+        """
+        Returns the index of the lists and members of the given board.
+
+        :param board_id: ID of the board
+        :param list_fields: Fields of the lists to retrieve
+        :param member_fields: Fields of the members to retrieve
+        """
+        return BoardIndex(self.get_board_lists(board_id, list_fields),
+                          self.get_board_members(board_id, member_fields))
+
+    def get_board_actions(self,
+                          board_id: str,
+                          action_types: List[str] = None,
+                          since: str = None,
+                          action_fields: List[str] = None,
+                          member_fields: List[str] = None
+                          ) -> List[Dict[str, Any]]:
+        """
+        Returns the actions of the given board, newest first.
+
+        :param board_id: ID of the board
+        :param action_types: Types of the actions to return (all if not given)
+        :param since: Action ID or date to return the actions after
+        :param action_fields: Fields of the actions to return
+        :param member_fields: Fields of the action creators to return
+        :return: List of the actions
+        """
+        params = {
+            'fields': require_fields(action_fields or ACTION_FIELDS, ['id']),
+            'memberCreator_fields': ','.join(member_fields or MEMBER_FIELDS),
+        }
+        if action_types:
+            params['filter'] = ','.join(action_types)
+        if since:
+            params['since'] = since
+        return self.get_paginated(url=f'/boards/{board_id}/actions',
+                                  params=params)
+
+    def get_board_comments(self,
+                           board_id: str,
+                           since: str = None) -> List[Dict[str, Any]]:
+        """
+        Returns the card comments of the given board, newest first, through
+        the paginated board actions rather than the actions of every card.
+
+        :param board_id: ID of the board
+        :param since: Action ID or date to return the comments after
+        :return: List of the comment actions
+        """
+        return self.get_board_actions(
+            board_id,
+            action_types=[ACTION_TYPES['comment_card']],
+            since=since,
+            action_fields=['type', 'date', 'data'],
+            member_fields=['username']
+        )
+
+    def get_board_attachments(
+            self,
+            board_id: str,
+            attachment_fields: List[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Returns the cards of the given board along with their attachments,
+        through the paginated board cards rather than the attachments of every
+        card.
+
+        :param board_id: ID of the board
+        :param attachment_fields: Fields of the attachments
+        :return: List of the cards with their `attachments`
+        """
+        attachment_fields = require_fields(
+            attachment_fields or ATTACHMENT_FIELDS, ['isUpload']
+        )
+        return self.get_paginated(url=f'/boards/{board_id}/cards',
+                                  params={'fields': 'id,idShort,shortLink',
+                                          'attachments': 'true',
+                                          'attachment_fields':
+                                              attachment_fields})
+
+    def download_attachment(
+            self,
+            attachment: Attachment,
+            directory: Union[str, os.PathLike]
+    ) -> Tuple[str, pathlib.Path]:
+        """
+        Streams the given attachment to disk in chunks, and stores it under
+        its content hash so that the duplicate files are stored once.
+
+        :param attachment: Attachment to download
+        :param directory: Directory to store the file in
+        :return: SHA-256 of the file, and its path
+        """
+        directory = pathlib.Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        temp_path = directory / f'.{attachment.id}.part'
+        digest = hashlib.sha256()
+        # The uploaded files are served only to OAuth-authorized requests
+        headers = {'Authorization':
+                   f'OAuth oauth_consumer_key="{self.api_key}", '
+                   f'oauth_token="{self.api_token}"'}
+        with self.session.get(attachment.url, headers=headers,
+                              stream=True) as response:
+            response.raise_for_status()
+            with open(temp_path, 'wb') as file:
+                for chunk in response.iter_content(DOWNLOAD_CHUNK_SIZE):
+                    digest.update(chunk)
+                    file.write(chunk)
+        sha256 = digest.hexdigest()
+        path = directory / f'{sha256}{pathlib.Path(attachment.name).suffix}'
+        if path.exists():
+            temp_path.unlink()
+        else:
+            os.replace(temp_path, path)
+        return sha256, path
+
+    def download_attachments_bulk(
+            self,
+            attachments: List[Attachment],
+            directory: Union[str, os.PathLike],
+            journal: Journal = None
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        Concurrently downloads the given attachments.
+        A failed download is logged and left to the next run.
+
+        :param attachments: List of the attachments to download
+        :param directory: Directory to store the files in
+        :param journal: Journal to skip the attachments already downloaded by
+            the previous runs, and to record the downloaded ones to
+        :return: Mapping of the attachment IDs to their SHA-256 and path
+        """
+        downloads = {}
+        pending = []
+        for attachment in attachments:
+            if (journal and journal.has('Attachments', attachment.id)
+                    and os.path.exists(journal.get('Attachments',
+                                                   attachment.id)['path'])):
+                downloads[attachment.id] = journal.get('Attachments',
+                                                       attachment.id)
+            else:
+                pending.append(attachment)
+        print(f'Attachments: {len(attachments)}, '
+              f'already downloaded: {len(downloads)}')
+
+        progress = Progress('Attachments', total=len(pending))
+        futures = {self.executor.submit(self.download_attachment, attachment,
+                                        directory): attachment
+                   for attachment in pending}
+        failed_count = 0
+        for future in as_completed(futures):
+            attachment = futures[future]
+            try:
+                sha256, path = future.result()
+            except Exception as error:
+                logging.error(f'Failed to download the attachment '
+                              f'{attachment.id} of Card '
+                              f'{attachment.card_number}: {error}')
+                failed_count += 1
+                continue
+            downloads[attachment.id] = {'sha256': sha256, 'path': str(path)}
+            if journal:
+                journal.write([('Attachments', attachment.id,
+                                downloads[attachment.id])])
+            progress.update()
+        print(f'Downloaded {len(pending) - failed_count} attachments, '
+              f'failed {failed_count}\n')
+        return downloads
+
+    def get_board_latest_action(self, board_id: str) -> Dict[str, Any]:
+        response = self.request(method='GET',
+                                url=f'/boards/{board_id}/actions',
+                                params={'limit': 1})
+        response.raise_for_status()
+        return next(iter(response.json()), {})
+
+    def create_webhook(self,
+                       callback_url: str,
+                       model_id: str,
+                       description: str = None) -> Dict[str, Any]:
+        """
+        Registers a webhook calling the given URL back on every action of the
+        given model (e.g. a board).
+        Trello checks the callback URL with a `HEAD` request beforehand.
+
+        :param callback_url: Publicly reachable URL of the receiver
+        :param model_id: ID of the model to watch
+        :param description: Description of the webhook
+        :return: The created webhook
+        """
+        params = {'callbackURL': callback_url, 'idModel': model_id}
+        if description:
+            params['description'] = description
+        response = self.request(method='POST', url='/webhooks',
+                                params=params)
+        response.raise_for_status()
+        return response.json()
+
+    def delete_webhook(self, webhook_id: str) -> None:
+        response = self.request(method='DELETE',
+                                url=f'/webhooks/{webhook_id}')
+        response.raise_for_status()
+
+    def get_organization_boards(
+            self,
+            organization_id: str,
+            board_fields: List[str] = None
+    ) -> List[Dict[str, Any]]:
+        board_fields = ','.join(board_fields or ['id', 'name', 'shortLink'])
         response = self.request(method='GET',
-                                url=f'/boards/{board_id}/cards')
+                                url=f'/organizations/{organization_id}/boards',
+                                params={'filter': 'open',
+                                        'fields': board_fields})
         response.raise_for_status()
         return response.json()
 
+    def get_board_snapshot(
+            self,
+            board_id: str,
+            card_fields: List[str] = None,
+            list_fields: List[str] = None,
+            member_fields: List[str] = None,
+            action_fields: List[str] = None
+    ) -> Tuple[List[Dict[str, Any]],
+               Dict[str, Dict[str, Any]],
+               Dict[str, List[Dict[str, Any]]],
+               Dict[str, List[Dict[str, Any]]],
+               Dict[str, List[Dict[str, Any]]]]:
+        """
+        Retrieves the cards of the given board along with their list, creation
+        actions, members and Power-Ups using a handful of paginated board-level
+        requests instead of a request per card per resource.
+
+        :param board_id: ID of the board
+        :param card_fields: Fields of the cards to retrieve
+        :param list_fields: Fields of the lists to retrieve
+        :param member_fields: Fields of the card members (and the action
+            creators) to retrieve
+        :param action_fields: Fields of the actions to retrieve
+        :return: The board cards and the mappings of card Short Links to the
+            list, actions, members and Power-Ups (Plugins) respectively
+        """
+        cards = self.get_paginated(
+            url=f'/boards/{board_id}/cards',
+            params={'fields': require_fields(card_fields or CARD_FIELDS,
+                                             ['id', 'shortLink', 'idList']),
+                    'members': 'true',
+                    'member_fields': ','.join(member_fields or MEMBER_FIELDS),
+                    'pluginData': 'true'}
+        )
+        print(f'Cards: {len(cards)}')
+        lists = {list_['id']: list_
+                 for list_ in self.get_board_lists(board_id, list_fields)}
+        # The action data tells the card of the action
+        actions = self.get_board_actions(
+            board_id,
+            action_types=[ACTION_TYPES['create_card']],
+            action_fields=(action_fields if not action_fields
+                           else [*action_fields, 'data']),
+            member_fields=member_fields
+        )
+        print(f'Actions: {len(actions)}')
+
+        list_mapping = {}
+        actions_mapping = {card['shortLink']: [] for card in cards}
+        members_mapping = {}
+        powerups_mapping = {}
+        for card in cards:
+            card_id = card['shortLink']
+            list_mapping[card_id] = lists.get(card['idList'], {})
+            members_mapping[card_id] = card.pop('members', [])
+            powerups_mapping[card_id] = card.pop('pluginData', [])
+        for action in actions:
+            card_id = action.get('data', {}).get('card', {}).get('shortLink')
+            if card_id in actions_mapping:
+                actions_mapping[card_id].append(action)
+        print('Finished retrieving Board snapshot\n')
+        return (cards, list_mapping, actions_mapping,
+                members_mapping, powerups_mapping)
+
     def get_card(self, card_id: str) -> Dict[str, Any]:
         response = self.request(method='GET',
                                 url=f'/cards/{card_id}')
         response.raise_for_status()
         return response.json()
 
+    def get_cards_bulk(
+            self,
+            cards: List[Dict[str, Any]],
+            card_fields: List[str] = None,
+            journal: Journal = None
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        Returns a mapping of the complete cards for the given (partial) cards.
+
+        :param cards: List of the cards each with at least its Short Link
+        :param card_fields: Fields of the cards to retrieve
+        :param journal: Journal of the retrieved cards to resume from
+        :return: Mapping of card Short Links to the cards
+        """
+        card_fields = ','.join(card_fields or CARD_FIELDS)
+        return self.get_cards_resources_bulk(cards, {
+            'Details': ('', {'fields': card_fields}),
+        }, journal)['Details']
+
     def get_card_list(self,
                       card_id: str,
                       list_fields: List[str] = None) -> Dict[str, Any]:
@@ -89,31 +760,23 @@ class Trello:
             cards: List[Dict[str, Any]],
             list_fields: List[str] = None
     ) -> Dict[str, List[Dict[str, Any]]]:
-        session = requests.Session()
-        session.params = {'key': self.api_key, 'token': self.api_token}
-
         list_fields = ','.join(list_fields or LIST_FIELDS)
-        list_mapping = {}
-        for card in cards:
-            response = session.get(
-                url=f'{self.api_base_url}/cards/{card["shortLink"]}/list',
-                params={'fields': list_fields}
-            )
-            response.raise_for_status()
-            list_mapping[card['shortLink']] = response.json()
-            if len(list_mapping) % 10 == 0:
-                print(f'List {len(list_mapping)}')
-        print('Finished retrieving Cards list\n')
-        return list_mapping
+        return self.get_cards_resources_bulk(cards, {
+            'List': ('/list', {'fields': list_fields}),
+        })['List']
 
     def get_card_actions(self,
                          card_id: str,
                          action_types: List[str] = None,
-                         action_limit: int = 1000) -> List[Dict[str, Any]]:
+                         action_limit: int = 1000,
+                         action_fields: List[str] = None
+                         ) -> List[Dict[str, Any]]:
         action_filter = ','.join(action_types or ACTION_TYPES.values())
+        action_fields = ','.join(action_fields or ACTION_FIELDS)
         response = self.request(method='GET',
                                 url=f'/cards/{card_id}/actions',
                                 params={'filter': action_filter,
+                                        'fields': action_fields,
                                         'limit': action_limit})
         response.raise_for_status()
         return response.json()
@@ -123,23 +786,15 @@ class Trello:
             cards: List[Dict[str, Any]],
             action_types: List[str] = None,
             action_limit: int = 1000,
+            action_fields: List[str] = None
     ) -> Dict[str, List[Dict[str, Any]]]:
-        session = requests.Session()
-        session.params = {'key': self.api_key, 'token': self.api_token}
-
         action_filter = ','.join(action_types or ACTION_TYPES.values())
-        actions_mapping = {}
-        for card in cards:
-            response = session.get(
-                url=f'{self.api_base_url}/cards/{card["shortLink"]}/actions',
-                params={'filter': action_filter, 'limit': action_limit}
-            )
-            response.raise_for_status()
-            actions_mapping[card['shortLink']] = response.json()
-            if len(actions_mapping) % 10 == 0:
-                print(f'Actions: {len(actions_mapping)}')
-        print('Finished retrieving Cards Actions\n')
-        return actions_mapping
+        action_fields = ','.join(action_fields or ACTION_FIELDS)
+        return self.get_cards_resources_bulk(cards, {
+            'Actions': ('/actions', {'filter': action_filter,
+                                     'fields': action_fields,
+                                     'limit': action_limit}),
+        })['Actions']
 
     def get_card_members(
             self,
@@ -156,24 +811,13 @@ class Trello:
     def get_cards_members_bulk(
             self,
             cards: List[Dict[str, Any]],
-            member_fields: List[str] = None
+            member_fields: List[str] = None,
+            journal: Journal = None
     ) -> Dict[str, List[Dict[str, Any]]]:
-        session = requests.Session()
-        session.params = {'key': self.api_key, 'token': self.api_token}
-
         member_fields = ','.join(member_fields or MEMBER_FIELDS)
-        members_mapping = {}
-        for card in cards:
-            response = session.get(
-                url=f'{self.api_base_url}/cards/{card["shortLink"]}/members',
-                params={'fields': member_fields}
-            )
-            response.raise_for_status()
-            members_mapping[card['shortLink']] = response.json()
-            if len(members_mapping) % 10 == 0:
-                print(f'Members: {len(members_mapping)}')
-        print('Finished retrieving Cards Members\n')
-        return members_mapping
+        return self.get_cards_resources_bulk(cards, {
+            'Members': ('/members', {'fields': member_fields}),
+        }, journal)['Members']
 
     def get_card_powerups(self,
                           card_id: str) -> List[Dict[str, Any]]:
@@ -190,23 +834,123 @@ class Trello:
         Returns a mapping of Power-Ups (Plugins) data for the given cards.
 
         :param cards: List of the cards to get the Power-Ups for
-        :param timeout: Timeout in seconds to wait between API calls
         :return: Mapping of card Short Links to the Power-Ups (Plugins)
         """
-        session = requests.Session()
-        session.params = {'key': self.api_key, 'token': self.api_token}
+        return self.get_cards_resources_bulk(cards, {
+            'Power-Ups': ('/pluginData', {}),
+        })['Power-Ups']
 
-        powerups_mapping = {}
+    @staticmethod
+    def parse_card(card: Dict[str, Any],
+                   list_: Dict[str, Any],
+                   actions: List[Dict[str, Any]],
+                   members: List[Dict[str, Any]],
+                   powerups: List[Dict[str, Any]],
+                   users_mapping: Dict[str, str]) -> Card:
+        """
+        Parses the given card and its resources into a compact Card.
+
+        :param users_mapping: Mapping of Trello to YouTrack usernames
+        """
+        assignees = Trello.parse_card_assignees_username(members)
+        if not assignees:
+            # The cards without members export no rows, so only their
+            # number and Short Link are parsed
+            return Card(id_short=Trello.parse_card_id_short(card),
+                        short_link=card.get('shortLink', ''),
+                        author='', created='', summary='', description='',
+                        sprint='', story_points='', assignees=(), due='')
+        author, created = Trello.parse_card_creator_username_and_date(
+            actions, users_mapping
+        )
+        return Card(
+            id_short=Trello.parse_card_id_short(card),
+            short_link=card.get('shortLink', ''),
+            author=author,
+            created=created,
+            summary=Trello.parse_card_summary(card),
+            description=Trello.parse_card_description(card),
+            sprint=Trello.parse_card_list(list_),
+            story_points=Trello.parse_story_points(powerups),
+            assignees=tuple(users_mapping.get(assignee, '')
+                            for assignee in assignees),
+            due=Trello.parse_card_due(card),
+        )
+
+    @staticmethod
+    def parse_cards(cards: List[Dict[str, Any]],
+                    list_mapping: Dict[str, Dict[str, Any]],
+                    actions_mapping: Dict[str, List[Dict[str, Any]]],
+                    members_mapping: Dict[str, List[Dict[str, Any]]],
+                    powerups_mapping: Dict[str, List[Dict[str, Any]]],
+                    users_mapping: Dict[str, str]) -> List[Card]:
+        """
+        Parses the given cards, along with the mappings of their Short Links
+        to their resources, into compact Cards.
+        The cards missing any of their resources (i.e. deleted meanwhile) are
+        skipped.
+        """
+        parsed_cards = []
         for card in cards:
-            response = session.get(
-                url=f'{self.api_base_url}/cards/{card["shortLink"]}/pluginData'
-            )
-            response.raise_for_status()
-            powerups_mapping[card['shortLink']] = response.json()
-            if len(powerups_mapping) % 10 == 0:
-                print(f'Power-Ups: {len(powerups_mapping)}')
-        print('Finished retrieving Cards Power-Ups\n')
-        return powerups_mapping
+            card_id = card['shortLink']
+            try:
+                resources = (list_mapping[card_id], actions_mapping[card_id],
+                             members_mapping[card_id],
+                             powerups_mapping[card_id])
+            except KeyError:
+                logging.error(f'Skipped the Card {card_id} missing some of '
+                              f'its resources')
+                continue
+            parsed_cards.append(Trello.parse_card(card, *resources,
+                                                  users_mapping))
+        return parsed_cards
+
+    @staticmethod
+    def parse_comment(action: Dict[str, Any],
+                      users_mapping: Dict[str, str]) -> Optional[Comment]:
+        """
+        Parses the given comment action into a Comment.
+
+        :param users_mapping: Mapping of Trello to YouTrack usernames
+        :return: The comment, or `None` if it cannot be parsed
+        """
+        try:
+            trello_username = action.get('memberCreator', {}).get('username')
+            return Comment(id_=action['id'],
+                           card_number=str(action['data']['card']['idShort']),
+                           author=users_mapping.get(trello_username, ''),
+                           created=action['date'],
+                           text=action['data']['text'])
+        except Exception:
+            logging.error(f'Failed to parse the Card comment: {action}')
+        return None
+
+    @staticmethod
+    def parse_attachments(cards: List[Dict[str, Any]]) -> List[Attachment]:
+        """
+        Parses the files uploaded to the given cards into Attachments, leaving
+        out the attached links.
+
+        :param cards: List of the cards with their `attachments`
+        :return: List of the attachments
+        """
+        return [Attachment(id_=attachment['id'],
+                           card_number=str(card['idShort']),
+                           name=attachment.get('name') or attachment['id'],
+                           url=attachment['url'],
+                           size=attachment.get('bytes') or 0,
+                           mime_type=attachment.get('mimeType') or '')
+                for card in cards
+                for attachment in card.get('attachments') or []
+                if attachment.get('isUpload')]
+
+    @staticmethod
+    def parse_card_id_short(card: Dict[str, Any]) -> str:
+        try:
+            return str(card['idShort'])
+        except Exception:
+            logging.error(f'Failed to parse Card number: {card}')
+        return ''
 
     @staticmethod
     def parse_card_number(card: Dict[str, Any], assignee_index: int) -> str:
@@ -294,23 +1038,62 @@ class Trello:
                       key=lambda row: int(row['ID'].split('-')[0]),
                       reverse=False)
 
+    @staticmethod
+    def sort_cards(cards: List[Card]) -> List[Card]:
+        return sorted(cards, key=lambda card: card.number)
+
+    @staticmethod
+    def sort_board_external(
+            board: Iterable[Tuple[int, Dict[str, Any]]],
+            chunk_size: int = 10_000
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Sorts the given board like `sort_board` but with bounded memory.
+
+        :param board: Iterable of Board Cards each as a row along with its
+            numeric sort key (the Card number)
+        :param chunk_size: Maximum number of rows held in memory
+        :return: Iterator of the sorted rows
+        """
+        for _, row in external_sort(board,
+                                    key=itemgetter(0),
+                                    chunk_size=chunk_size):
+            yield row
+
     def export_board_csv(self,
-                         board: List[Dict[str, Any]],
+                         board: Iterable[Dict[str, Any]],
                          csv_path: Union[str, bytes, os.PathLike],
                          csv_header: List[str]) -> None:
         """
         Writes the given board to a CSV file at the given path.
 
-        :param board: List of Board Cards each as a row
+        :param board: Iterable of Board Cards each as a row
         :param csv_path: Path to the output CSV file
         :param csv_header: CSV header
         :return:
         """
-        with open(csv_path, mode='w', newline='', encoding='utf-8') as file:
-            csv_writer = csv.DictWriter(file, fieldnames=csv_header)
-            # Write the header
-            csv_writer.writeheader()
-            # Write the rows beyond the header
-            for row in board:
-                csv_writer.writerow(row)
-        print(f'Successfully exported {len(board)} rows!')
+        self.export_board(board, csv_path, csv_header, output_format='csv')
+
+    def export_board(self,
+                     board: Iterable[Dict[str, Any]],
+                     path: Union[str, os.PathLike],
+                     header: List[str],
+                     output_format: str = None,
+                     compression: str = None) -> None:
+        """
+        Writes the given board to a CSV, JSON Lines or Parquet file at the
+        given path, optionally compressed, in batches of rows.
+
+        :param board: Iterable of Board Cards each as a row
+        :param path: Path to the output file
+        :param header: Columns of the rows (the CSV header)
+        :param output_format: `csv`, `jsonl` or `parquet` (from the path if
+            not given)
+        :param compression: `gzip` or `zstd` (from the path if the format is
+            not given)
+        :return:
+        """
+        rows_count = write_board(board, path, header,
+                                 output_format=output_format,
+                                 compression=compression)
+        print(f'Successfully exported {rows_count} rows!')
@@ -0,0 +1,208 @@
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Dict, Any, Callable, Set, Hashable
+
+import requests
+
+# Header of the Trello webhook callbacks carrying their signature
+SIGNATURE_HEADER = 'X-Trello-Webhook'
+
+
+def sign_webhook(secret: str, body: bytes, callback_url: str) -> str:
+    """
+    Returns the signature of a Trello webhook callback: the base64-encoded
+    HMAC-SHA1 of its body followed by the callback URL, keyed by the API
+    secret.
+    """
+    digest = hmac.new(secret.encode('utf-8'),
+                      body + callback_url.encode('utf-8'),
+                      hashlib.sha1).digest()
+    return base64.b64encode(digest).decode('ascii')
+
+
+def verify_webhook(secret: str,
+                   body: bytes,
+                   callback_url: str,
+                   signature: str) -> bool:
+    return hmac.compare_digest(sign_webhook(secret, body, callback_url),
+                               signature or '')
+
+
+def send_webhook(callback_url: str,
+                 secret: str,
+                 payload: Dict[str, Any],
+                 url: str = None) -> requests.Response:
+    """
+    Sends a signed webhook callback the same way Trello does, e.g. to
+    simulate the changes of a board.
+
+    :param callback_url: Callback URL the webhook is registered with
+    :param secret: Trello API secret
+    :param payload: Callback body, with the `action` and the `model`
+    :param url: URL to send the callback to, if the receiver is reached
+        through another URL than the registered one (e.g. behind a proxy)
+    :return: Response of the receiver
+    """
+    body = json.dumps(payload).encode('utf-8')
+    return requests.post(url or callback_url, data=body, headers={
+        'Content-Type': 'application/json',
+        SIGNATURE_HEADER: sign_webhook(secret, body, callback_url),
+    })
+
+
+class Debouncer:
+    def __init__(self,
+                 apply: Callable[[Set[Hashable]], None],
+                 delay: float = 2.0,
+                 max_delay: float = 30.0):
+        """
+        Coalesces bursts of the submitted keys, e.g. the changed cards, and
+        applies them in batches from a background thread once no key is
+        submitted for the given delay.
+
+        :param apply: Function applying a batch of keys
+        :param delay: Time in seconds without submissions to wait for before
+            applying the pending keys
+        :param max_delay: Maximum time in seconds a key waits for under
+            continuous submissions
+        """
+        self.apply = apply
+        self.delay = delay
+        self.max_delay = max_delay
+
+        self.condition = threading.Condition()
+        self.pending: Set[Hashable] = set()
+        self.first_at = None
+        self.last_at = None
+        self.closed = False
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def submit(self, key: Hashable) -> None:
+        with self.condition:
+            now = time.monotonic()
+            if not self.pending:
+                self.first_at = now
+            self.pending.add(key)
+            self.last_at = now
+            self.condition.notify()
+
+    def due_at(self) -> float:
+        return min(self.last_at + self.delay, self.first_at + self.max_delay)
+
+    def run(self) -> None:
+        while True:
+            with self.condition:
+                while not self.closed and (
+                        not self.pending
+                        or time.monotonic() < self.due_at()):
+                    timeout = (self.due_at() - time.monotonic()
+                               if self.pending else None)
+                    self.condition.wait(timeout)
+                if not self.pending:
+                    return
+                keys, self.pending = self.pending, set()
+            try:
+                self.apply(keys)
+            except Exception as error:
+                logging.error(f'Failed to apply {len(keys)} changes: {error}')
+
+    def close(self) -> None:
+        """
+        Applies the pending keys right away and stops the background thread.
+        """
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
+        self.thread.join()
+
+
+class WebhookReceiver:
+    def __init__(self,
+                 secret: str,
+                 callback_url: str,
+                 on_action: Callable[[Dict[str, Any]], None],
+                 host: str = '127.0.0.1',
+                 port: int = 8080):
+        """
+        Local HTTP receiver of the Trello webhook callbacks, passing the
+        action of every verified callback on.
+
+        :param secret: Trello API secret the callbacks are signed with
+        :param callback_url: Callback URL the webhook is registered with, as
+            it is a part of the signature
+        :param on_action: Function called with the action of each callback
+        :param host: Host to listen on
+        :param port: Port to listen on (any free port if `0`)
+        """
+        self.secret = secret
+        self.callback_url = callback_url
+        self.on_action = on_action
+        self.rejected_count = 0
+
+        receiver = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_HEAD(self):
+                # Trello checks the callback URL when creating the webhook
+                self.send_response(200)
+                self.end_headers()
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length)
+                status = receiver.receive(body,
+                                          self.headers.get(SIGNATURE_HEADER))
+                self.send_response(status)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever,
+                                       daemon=True)
+
+    @property
+    def port(self) -> int:
+        return self.httpd.server_port
+
+    def receive(self, body: bytes, signature: str) -> int:
+        """
+        Handles a callback and returns the HTTP status of the response.
+        """
+        if not verify_webhook(self.secret, body, self.callback_url,
+                              signature):
+            self.rejected_count += 1
+            logging.warning('Rejected a webhook callback with an invalid '
+                            'signature')
+            return 401
+        try:
+            action = json.loads(body)['action']
+        except (ValueError, KeyError):
+            logging.warning(f'Ignored a malformed webhook callback: {body}')
+            return 400
+        self.on_action(action)
+        return 200
+
+    def start(self) -> 'WebhookReceiver':
+        self.thread.start()
+        return self
+
+    def close(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self) -> 'WebhookReceiver':
+        return self.start()
+
+    def __exit__(self, *args) -> None:
+        self.close()
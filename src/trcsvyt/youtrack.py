@@ -1,16 +1,49 @@
-from typing import List, Dict, Any
+import logging
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from itertools import islice
+from typing import List, Dict, Any, Iterator, Optional, Tuple, Union
 
 import requests
 
+from src.trcsvyt.cache import ResponseCache
+from src.trcsvyt.metadata import ProjectMetadata, PROJECT_FIELD_FIELDS, \
+    USER_FIELDS
+from src.trcsvyt.metrics import Metrics, Progress
+from src.trcsvyt.ratelimit import RateGovernor
+from src.trcsvyt.transport import TransportAdapter
+
 ISSUE_FIELDS = \
     'id,summary,created,updated,' \
     'customFields(id,name,' \
     'value(avatarUrl,buildLink,color(id),fullName,id,isResolved,' \
     'localizedName,login,minutes,name,presentation,text))'
 
+# Number of Issues retrieved per request when paging through them
+ISSUES_PAGE_SIZE = 200
+
+# Number of Issues a single command is applied to per request
+COMMAND_ISSUES_LIMIT = 100
+
+# Issue attributes that are not custom fields, so cannot be set by commands
+ISSUE_ATTRIBUTES = {'summary', 'description'}
+
+# Database IDs (e.g. `2-15`) as opposed to readable IDs (e.g. `DEMO-15`)
+DATABASE_ID_PATTERN = re.compile(r'^\d+-\d+$')
+
+STORY_POINTS_FIELD = 'Story points'
+
+# Time in seconds the project metadata is reused for
+METADATA_TTL = 3600
+
 
 class YouTrack:
-    def __init__(self, api_base_url: str = None, perm_token: str = None):
+    def __init__(self, api_base_url: str = None, perm_token: str = None,
+                 cache: ResponseCache = None,
+                 governor: RateGovernor = None,
+                 metrics: Metrics = None):
         """
         Adapter class for YouTrack.
 
@@ -18,13 +51,25 @@ class YouTrack:
             (e.g. https://www.example.com/youtrack/api).
         :param perm_token: YouTrack permanent token. Refer to:
             https://www.jetbrains.com/help/youtrack/devportal/authentication-with-permanent-token.html
+        :param cache: On-disk cache of the GET responses (disabled if not
+            given)
+        :param governor: Rate governor of the requests (defaults to one with
+            no rate limit that still retries the throttled requests)
+        :param metrics: Recorder of the request metrics (disabled if not
+            given)
         """
         self.api_base_url = api_base_url
         self.perm_token = perm_token
+        self.cache = cache
+        self.governor = governor or RateGovernor()
+        self.metrics = metrics
         if not self.api_base_url or not self.perm_token:
             raise ValueError('Both base URL and permanent token are required.')
 
         self.session = self.init_session()
+        # Mapping of project IDs to their metadata retrieved so far
+        self.projects_metadata: Dict[str, ProjectMetadata] = {}
+        self.metadata_lock = threading.Lock()
 
     def init_session(self) -> requests.Session:
         session = requests.Session()
@@ -34,6 +79,12 @@ class YouTrack:
             'Content-Type': 'application/json',
             'Accept': 'application/json',
         })
+        adapter = TransportAdapter(cache=self.cache,
+                                   governor=self.governor,
+                                   metrics=self.metrics,
+                                   client='youtrack')
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
         return session
 
     def get_issue(self,
@@ -47,37 +98,487 @@ class YouTrack:
         response.raise_for_status()
         return response.json()
 
+    def get_project(self, short_name: str) -> Dict[str, Any]:
+        response = self.session.get(
+            url=f'{self.api_base_url}/api/admin/projects',
+            params={'fields': 'id,shortName,name', 'query': short_name}
+        )
+        response.raise_for_status()
+        for project in response.json():
+            if project['shortName'] == short_name:
+                return project
+        raise ValueError(f'Project {short_name} not found')
+
+    def create_issue(self,
+                     project_id: str,
+                     summary: str,
+                     description: str = None,
+                     fields: str = None,
+                     custom_fields: List[Dict[str, Any]] = None
+                     ) -> Dict[str, Any]:
+        fields = fields or ISSUE_FIELDS
+        issue = {'project': {'id': project_id},
+                 'summary': summary,
+                 'description': description}
+        if custom_fields:
+            issue['customFields'] = custom_fields
+        response = self.session.post(
+            url=f'{self.api_base_url}/api/issues',
+            params={'fields': fields},
+            json=issue
+        )
+        response.raise_for_status()
+        return response.json()
+
+    def get_paginated(
+            self,
+            path: str,
+            fields: str,
+            page_size: int = ISSUES_PAGE_SIZE
+    ) -> List[Dict[str, Any]]:
+        """
+        Returns all the items of a paginated collection, e.g. the users.
+
+        :param path: Path of the collection relative to the API base URL
+        :param fields: Comma-separated list of fields to return
+        :param page_size: Number of items retrieved per request
+        :return: List of the items
+        """
+        items = []
+        while True:
+            response = self.session.get(
+                url=f'{self.api_base_url}{path}',
+                params={'fields': fields,
+                        '$skip': len(items),
+                        '$top': page_size}
+            )
+            response.raise_for_status()
+            page = response.json()
+            items.extend(page)
+            if len(page) < page_size:
+                return items
+
+    def get_project_custom_fields(self,
+                                  project_id: str) -> List[Dict[str, Any]]:
+        return self.get_paginated(
+            f'/api/admin/projects/{project_id}/customFields',
+            fields=PROJECT_FIELD_FIELDS
+        )
+
+    def get_users(self) -> List[Dict[str, Any]]:
+        return self.get_paginated('/api/users', fields=USER_FIELDS)
+
+    def get_project_metadata(
+            self,
+            project_id: str,
+            cache_path: Union[str, os.PathLike] = None,
+            ttl: float = METADATA_TTL
+    ) -> ProjectMetadata:
+        """
+        Returns the custom fields, bundle values and users of the given
+        project, retrieved once and then reused in memory, and optionally
+        from an on-disk copy across runs, for the given time.
+
+        :param project_id: Database ID of the project
+        :param cache_path: Path to the on-disk copy of the metadata (disabled
+            if not given)
+        :param ttl: Time in seconds the metadata is reused for
+        :return: The project metadata
+        """
+        with self.metadata_lock:
+            metadata = self.projects_metadata.get(project_id)
+            if metadata and metadata.is_fresh(ttl):
+                return metadata
+            if cache_path and os.path.exists(cache_path):
+                metadata = ProjectMetadata.read(cache_path)
+            if (not metadata or not metadata.is_fresh(ttl)
+                    or metadata.project_id != project_id):
+                metadata = ProjectMetadata.from_api(
+                    project_id,
+                    self.get_project_custom_fields(project_id),
+                    self.get_users()
+                )
+                print(f'Retrieved the metadata of project {project_id}: '
+                      f'{len(metadata.fields)} custom fields, '
+                      f'{len(metadata.users)} users')
+                if cache_path:
+                    metadata.write(cache_path)
+            self.projects_metadata[project_id] = metadata
+            return metadata
+
+    def get_issues_page(self,
+                        skip: int,
+                        count: int,
+                        fields: str = None,
+                        query: str = None) -> List[Dict[str, Any]]:
+        """
+        Returns a single page of Issues.
+
+        :param skip: Number of Issues to skip
+        :param count: Number of Issues to be retrieved
+        :param fields: Comma-separated list of fields to return
+        :param query: YouTrack search query to filter the Issues with
+            (e.g. `project: DEMO`)
+        :return: List of Issues
+        """
+        params = {'fields': fields or ISSUE_FIELDS,
+                  '$skip': skip,
+                  '$top': count}
+        if query:
+            params['query'] = query
+        response = self.session.get(url=f'{self.api_base_url}/api/issues',
+                                    params=params)
+        response.raise_for_status()
+        return response.json()
+
+    def iter_issues(self,
+                    fields: str = None,
+                    query: str = None,
+                    page_size: int = ISSUES_PAGE_SIZE,
+                    prefetch: bool = True) -> Iterator[Dict[str, Any]]:
+        """
+        Yields the Issues page by page as they arrive.
+
+        :param fields: Comma-separated list of fields to return
+        :param query: YouTrack search query to filter the Issues with
+            (e.g. `project: DEMO`)
+        :param page_size: Number of Issues retrieved per request
+        :param prefetch: Whether to retrieve the next page while the current
+            one is being consumed
+        :return: Iterator of Issues
+        """
+        skip = 0
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            page = self.get_issues_page(skip, page_size, fields, query)
+            while page:
+                skip += len(page)
+                next_page = None
+                if prefetch and len(page) == page_size:
+                    next_page = executor.submit(self.get_issues_page,
+                                                skip, page_size, fields, query)
+                yield from page
+                print(f'Issues: {skip}')
+                if len(page) < page_size:
+                    break
+                if next_page:
+                    page = next_page.result()
+                else:
+                    page = self.get_issues_page(skip, page_size,
+                                                fields, query)
+
     def get_all_issues(self,
                        count: int = 1_000_000,
-                       fields: str = None) -> List[Dict[str, Any]]:
+                       fields: str = None,
+                       query: str = None) -> List[Dict[str, Any]]:
         """
         Returns a list of top `count` Issues.
 
         :param count: Number of Issues to be retrieved
         :param fields: Comma-separated list of fields to return
+        :param query: YouTrack search query to filter the Issues with
         :return: List of Issues
         """
-        fields = fields or ISSUE_FIELDS
-        response = self.session.get(
-            url=f'{self.api_base_url}/api/issues',
-            params={'fields': fields, '$top': count}
+        return list(islice(self.iter_issues(fields=fields, query=query),
+                           count))
+
+    def add_comment(self,
+                    issue_id: str,
+                    text: str,
+                    fields: str = 'id') -> Dict[str, Any]:
+        response = self.session.post(
+            url=f'{self.api_base_url}/api/issues/{issue_id}/comments',
+            params={'fields': fields},
+            json={'text': text}
         )
         response.raise_for_status()
         return response.json()
 
-    def update_issue_story_points(self,
-                                  issue_id: str,
-                                  story_points: int,
-                                  story_points_field_id: str = '192-57',
-                                  fields: str = None) -> Dict[str, Any]:
+    def try_add_comment(self, issue_id: str, text: str) -> Optional[str]:
+        try:
+            self.add_comment(issue_id, text)
+        except Exception as error:
+            return str(error)
+        return None
+
+    def add_comments_bulk(self,
+                          comments: List[Tuple[str, str]],
+                          max_workers: int = 8) -> List[Optional[str]]:
+        """
+        Adds the given comments to their Issues concurrently, within the
+        rate limits of the governor.
+        The comments of an Issue are added in the given order.
+
+        :param comments: List of the Issue IDs and the comment texts
+        :param max_workers: Number of concurrent requests
+        :return: List of `None` per added comment or the error otherwise
+        """
+        issues_comments = {}
+        for i, (issue_id, text) in enumerate(comments):
+            issues_comments.setdefault(issue_id, []).append((i, text))
+
+        def add_issue_comments(
+                issue_id: str,
+                issue_comments: List[Tuple[int, str]]
+        ) -> List[Tuple[int, Optional[str]]]:
+            return [(i, self.try_add_comment(issue_id, text))
+                    for i, text in issue_comments]
+
+        results = [None] * len(comments)
+        progress = Progress('Comments', total=len(comments))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(add_issue_comments, issue_id,
+                                       issue_comments)
+                       for issue_id, issue_comments in issues_comments.items()]
+            for future in as_completed(futures):
+                for i, error in future.result():
+                    results[i] = error
+                    progress.update()
+        for (issue_id, _), error in zip(comments, results):
+            if error:
+                logging.error(f'Failed to comment on Issue {issue_id}: '
+                              f'{error}')
+        failed_count = sum(1 for error in results if error)
+        print(f'Added {len(comments) - failed_count} comments, '
+              f'failed {failed_count}\n')
+        return results
+
+    def upload_attachment(self,
+                          issue_id: str,
+                          path: Union[str, os.PathLike],
+                          name: str,
+                          fields: str = 'id,name') -> List[Dict[str, Any]]:
+        with open(path, 'rb') as file:
+            response = self.session.post(
+                url=f'{self.api_base_url}/api/issues/{issue_id}/attachments',
+                params={'fields': fields},
+                files={'upload': (name, file)},
+                # Unset the JSON Content-Type of the session, so that the
+                # multipart one is set along with its boundary
+                headers={'Content-Type': None}
+            )
+        response.raise_for_status()
+        return response.json()
+
+    def try_upload_attachment(self,
+                              issue_id: str,
+                              path: Union[str, os.PathLike],
+                              name: str) -> Optional[str]:
+        try:
+            self.upload_attachment(issue_id, path, name)
+        except Exception as error:
+            return str(error)
+        return None
+
+    def upload_attachments_bulk(
+            self,
+            attachments: List[Tuple[str, Union[str, os.PathLike], str]],
+            max_workers: int = 4
+    ) -> List[Optional[str]]:
+        """
+        Uploads the given files to their Issues concurrently, within the rate
+        limits of the governor.
+        At most `max_workers` files are uploaded, so held in memory, at once.
+
+        :param attachments: List of the Issue IDs, the file paths and the
+            attachment names
+        :param max_workers: Number of concurrent uploads
+        :return: List of `None` per uploaded file or the error otherwise
+        """
+        results = [None] * len(attachments)
+        progress = Progress('Attachments', total=len(attachments))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(self.try_upload_attachment, issue_id,
+                                       path, name): i
+                       for i, (issue_id, path, name) in enumerate(attachments)}
+            for future in as_completed(futures):
+                results[futures[future]] = future.result()
+                progress.update()
+        for (issue_id, _, name), error in zip(attachments, results):
+            if error:
+                logging.error(f'Failed to upload {name} to Issue {issue_id}: '
+                              f'{error}')
+        failed_count = sum(1 for error in results if error)
+        print(f'Uploaded {len(attachments) - failed_count} attachments, '
+              f'failed {failed_count}\n')
+        return results
+
+    def update_issue_story_points(
+            self,
+            issue_id: str,
+            story_points: int,
+            story_points_field_id: str = None,
+            fields: str = None,
+            metadata: ProjectMetadata = None
+    ) -> Dict[str, Any]:
+        """
+        Sets the Story points of the given Issue.
+
+        :param story_points_field_id: ID of the Story points field of the
+            project (resolved from the metadata if not given)
+        :param metadata: Metadata of the project of the Issue
+        """
         fields = fields or ISSUE_FIELDS
+        if not story_points_field_id:
+            if not metadata:
+                raise ValueError('Either the Story points field ID or the '
+                                 'project metadata is required.')
+            story_points_field_id = metadata.get_field_id(STORY_POINTS_FIELD)
         response = self.session.post(
             url=f'{self.api_base_url}/api/issues/{issue_id}',
             params={'fields': fields},
             json={'customFields': [{'$type': 'SimpleIssueCustomField',
                                     'id': story_points_field_id,
-                                    'name': 'Story points',
+                                    'name': STORY_POINTS_FIELD,
                                     'value': story_points}]}
         )
         response.raise_for_status()
         return response.json()
+
+    def apply_command(self, query: str, issue_ids: List[str]) -> None:
+        """
+        Applies the given command to the given Issues in a single request.
+
+        :param query: YouTrack command (e.g. `Story points 3 State Done`)
+        :param issue_ids: IDs of the Issues, either database or readable ones
+        """
+        issues = [{'id': issue_id} if DATABASE_ID_PATTERN.match(issue_id)
+                  else {'idReadable': issue_id}
+                  for issue_id in issue_ids]
+        response = self.session.post(
+            url=f'{self.api_base_url}/api/commands',
+            json={'query': query, 'issues': issues}
+        )
+        response.raise_for_status()
+
+    def update_issue(self,
+                     issue_id: str,
+                     attributes: Dict[str, Any],
+                     fields: str = None) -> Dict[str, Any]:
+        fields = fields or ISSUE_FIELDS
+        response = self.session.post(
+            url=f'{self.api_base_url}/api/issues/{issue_id}',
+            params={'fields': fields},
+            json=attributes
+        )
+        response.raise_for_status()
+        return response.json()
+
+    @staticmethod
+    def build_command(changes: Dict[str, Any]) -> str:
+        """
+        Returns the command setting the given custom fields to their values,
+        e.g. `{'Story points': 3, 'State': 'In Progress'}` to
+        `Story points 3 State {In Progress}`.
+        """
+        command = []
+        for field_name, value in changes.items():
+            if value is None or value == '':
+                raise ValueError(f'Cannot clear {field_name} by a command')
+            value = str(value)
+            # Values with whitespaces are enclosed in braces
+            if re.search(r'\s', value):
+                value = f'{{{value}}}'
+            command.append(f'{field_name} {value}')
+        return ' '.join(command)
+
+    def apply_command_bulk(self,
+                           query: str,
+                           issue_ids: List[str]) -> Dict[str, Optional[str]]:
+        """
+        Applies the given command to the given Issues at once, and if it
+        fails, one by one to isolate the failed Issues.
+
+        :return: Mapping of Issue IDs to `None` if updated successfully or
+            the error otherwise
+        """
+        try:
+            self.apply_command(query, issue_ids)
+            return {issue_id: None for issue_id in issue_ids}
+        except Exception as error:
+            if len(issue_ids) == 1:
+                return {issue_ids[0]: str(error)}
+        results = {}
+        for issue_id in issue_ids:
+            results.update(self.apply_command_bulk(query, [issue_id]))
+        return results
+
+    def try_update_issue(
+            self,
+            issue_id: str,
+            attributes: Dict[str, Any]
+    ) -> Dict[str, Optional[str]]:
+        try:
+            self.update_issue(issue_id, attributes, fields='id')
+        except Exception as error:
+            return {issue_id: str(error)}
+        return {issue_id: None}
+
+    def update_issues_bulk(
+            self,
+            changes: Dict[str, Dict[str, Any]],
+            max_workers: int = 8
+    ) -> Dict[str, Optional[str]]:
+        """
+        Updates the given Issues with as few requests as possible.
+        The custom field changes shared by several Issues are applied by a
+        single command per group of Issues, while the Issue attributes
+        (summary and description), along with the resolved `customFields`
+        if any, are updated per Issue concurrently.
+
+        :param changes: Mapping of Issue IDs to the mapping of the changed
+            field names (custom fields or Issue attributes) to their values,
+            and optionally of `customFields` to the resolved custom fields
+        :param max_workers: Number of concurrent requests
+        :return: Mapping of Issue IDs to `None` if updated successfully or
+            the error otherwise
+        """
+        results = {issue_id: None for issue_id in changes}
+        command_groups = {}
+        attribute_updates = {}
+        for issue_id, issue_changes in changes.items():
+            custom_fields = {}
+            for field_name, value in issue_changes.items():
+                if field_name.lower() in ISSUE_ATTRIBUTES:
+                    attribute_updates.setdefault(issue_id, {})[
+                        field_name.lower()] = value
+                elif field_name == 'customFields':
+                    # Already resolved, e.g. to replace multi-value fields
+                    attribute_updates.setdefault(issue_id, {})[
+                        field_name] = value
+                else:
+                    custom_fields[field_name] = value
+            if not custom_fields:
+                continue
+            try:
+                command = self.build_command(custom_fields)
+            except ValueError as error:
+                results[issue_id] = str(error)
+                continue
+            command_groups.setdefault(command, []).append(issue_id)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = []
+            for command, issue_ids in command_groups.items():
+                for i in range(0, len(issue_ids), COMMAND_ISSUES_LIMIT):
+                    futures.append(executor.submit(
+                        self.apply_command_bulk,
+                        command, issue_ids[i:i + COMMAND_ISSUES_LIMIT]
+                    ))
+            for issue_id, attributes in attribute_updates.items():
+                futures.append(executor.submit(self.try_update_issue,
+                                               issue_id, attributes))
+            print(f'Updating {len(changes)} Issues '
+                  f'with {len(futures)} requests')
+            progress = Progress('Update requests', total=len(futures))
+            for future in as_completed(futures):
+                progress.update()
+                for issue_id, error in future.result().items():
+                    results[issue_id] = results[issue_id] or error
+
+        failures = {issue_id: error for issue_id, error in results.items()
+                    if error is not None}
+        for issue_id, error in failures.items():
+            logging.error(f'Failed to update Issue {issue_id}: {error}')
+        print(f'Updated {len(results) - len(failures)} Issues, '
+              f'failed {len(failures)}\n')
+        return results